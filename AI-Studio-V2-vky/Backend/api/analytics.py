@@ -9,6 +9,7 @@ from services.analytics_service import AnalyticsService
 from services.analytics_websocket import analytics_ws_manager
 from utils.logger import get_logger
 from services.api_usage_tracker import extract_user_id_from_request
+from services.async_db import async_db
 from fastapi import Request
  
 logger = get_logger("analytics_api")
@@ -34,7 +35,7 @@ async def get_dashboard_metrics(request: Request):
     """Get dashboard metrics for the authenticated user"""
     try:
         user_id = await get_current_user_id(request)
-        metrics = analytics_service.get_dashboard_metrics(user_id=user_id)
+        metrics = await async_db.run(analytics_service.get_dashboard_metrics, user_id=user_id)
         return JSONResponse(content=metrics)
     except HTTPException:
         raise
@@ -57,10 +58,11 @@ async def get_usage_data(
         user_id = await get_current_user_id(request)
         
         if custom_days:
-            series_data = analytics_service.get_custom_usage_data(custom_days, user_id=user_id)
+            series_data = await async_db.run(
+                analytics_service.get_custom_usage_data, custom_days, user_id=user_id)
             return JSONResponse(content={"series": series_data})
         else:
-            usage_series = analytics_service.get_usage_series(user_id=user_id)
+            usage_series = await async_db.run(analytics_service.get_usage_series, user_id=user_id)
             if time_range in usage_series:
                 return JSONResponse(content={"series": usage_series[time_range]})
             else:
@@ -78,7 +80,7 @@ async def get_model_distribution(request: Request):
     """Get model usage distribution for the authenticated user"""
     try:
         user_id = await get_current_user_id(request)
-        distribution = analytics_service.get_model_distribution(user_id=user_id)
+        distribution = await async_db.run(analytics_service.get_model_distribution, user_id=user_id)
         return JSONResponse(content={"distribution": distribution})
     except HTTPException:
         raise
@@ -93,7 +95,7 @@ async def get_endpoint_stats(request: Request):
     """Get statistics by endpoint for the authenticated user"""
     try:
         user_id = await get_current_user_id(request)
-        stats = analytics_service.get_endpoint_stats(user_id=user_id)
+        stats = await async_db.run(analytics_service.get_endpoint_stats, user_id=user_id)
         return JSONResponse(content={"endpoints": stats})
     except HTTPException:
         raise
@@ -108,7 +110,7 @@ async def get_realtime_metrics(request: Request):
     """Get real-time metrics snapshot for the authenticated user"""
     try:
         user_id = await get_current_user_id(request)
-        metrics = analytics_service.get_real_time_metrics(user_id=user_id)
+        metrics = await async_db.run(analytics_service.get_real_time_metrics, user_id=user_id)
         return JSONResponse(content=metrics)
     except HTTPException:
         raise
@@ -118,6 +120,13 @@ async def get_realtime_metrics(request: Request):
             status_code=500, detail="Failed to retrieve real-time metrics")
  
  
+@router.get("/analytics/cache")
+async def get_cache_metrics(request: Request):
+    """Get hit ratios of the rerank score and embedding caches (per worker)"""
+    await get_current_user_id(request)
+    return JSONResponse(content=analytics_service.get_cache_metrics())
+ 
+ 
 from fastapi import Cookie
 from typing import Optional
  
@@ -209,7 +218,7 @@ async def test_analytics(request: Request):
     """Test endpoint to verify analytics data"""
     try:
         user_id = await get_current_user_id(request)
-        metrics = analytics_service.get_dashboard_metrics(user_id=user_id)
+        metrics = await async_db.run(analytics_service.get_dashboard_metrics, user_id=user_id)
         return JSONResponse(content={
             "status": "working",
             "user_id": user_id,
@@ -231,11 +240,12 @@ async def test_analytics(request: Request):
 async def analytics_health():
     """Health check for analytics service"""
     try:
-        analytics_service.get_connection().close()
+        await async_db.fetchone("SELECT 1")
+        realtime = await async_db.run(analytics_service.get_real_time_metrics)
         return JSONResponse(content={
             "status": "healthy",
             "service": "analytics",
-            "timestamp": analytics_service.get_real_time_metrics().get("timestamp")
+            "timestamp": realtime.get("timestamp")
         })
     except Exception as e:
         logger.error(f"Analytics health check failed: {e}")
@@ -6,6 +6,7 @@ from services.otp_service import generate_otp, verify_otp, store_pending_signup,
 from services.email_service import send_signup_otp_email, send_login_otp_email
 from core.database import get_db
 from models.user import User
+from services.async_db import async_db
 from datetime import datetime, timedelta
 from jwt.exceptions import InvalidTokenError
 import jwt
@@ -61,7 +62,7 @@ async def get_current_user(request: Request, db: Session = Depends(get_db)):
         if username is None or user_id is None:
             raise HTTPException(status_code=401, detail="Invalid token payload")
         
-        user = db.query(User).filter(User.id == user_id).first()
+        user = await async_db.run(lambda: db.query(User).filter(User.id == user_id).first())
         
         if not user:
             raise HTTPException(status_code=401, detail="User not found")
@@ -82,7 +83,8 @@ async def signup_request_otp(signup_data: SignupOTPInitRequest, db: Session = De
     """Step 1: Check if email exists and send OTP"""
     
     # Check if user already exists
-    existing_user = db.query(User).filter(User.email == signup_data.email).first()
+    existing_user = await async_db.run(
+        lambda: db.query(User).filter(User.email == signup_data.email).first())
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -190,7 +192,7 @@ async def login_request_otp(login_data: LoginOTPRequest, db: Session = Depends(g
     
     print(f"🔍 Looking up user: {login_data.email}")  # Debug log
     
-    user = db.query(User).filter(User.email == login_data.email).first()
+    user = await async_db.run(lambda: db.query(User).filter(User.email == login_data.email).first())
     if not user:
         print(f"❌ User not found: {login_data.email}")  # Debug log
         raise HTTPException(
@@ -330,7 +332,7 @@ async def refresh_token(request: Request, response: Response, db: Session = Depe
         if username is None or token_type != "refresh":
             raise HTTPException(status_code=401, detail="Invalid refresh token")
         
-        user = db.query(User).filter(User.username == username).first()
+        user = await async_db.run(lambda: db.query(User).filter(User.username == username).first())
         if not user:
             raise HTTPException(status_code=401, detail="User not found")
         
@@ -1,28 +1,49 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Depends
-from fastapi.responses import JSONResponse, FileResponse
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, UploadFile, File, Depends, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, ValidationError
 from typing import Optional
 from dotenv import load_dotenv
 import os
 from openai import OpenAI
 import traceback
-import uuid
+import asyncio
+import json
 from datetime import datetime
  
 # NEW IMPORTS
 from services.responder import Responsellm
 from services.file_service import FileService
 from services.embedding_service import EmbeddingService
+from services.embedding_cache import embedding_cache, query_embedding_cache
+from services.bm25_index import bm25_indexes
+from services.ingestion_queue import IngestionQueue
+from services.inference_executor import executor_stats
+from services.lazy_service import LazyService
+from utils.snowflake_pool import snowflake_pool
+from services.async_db import async_db
  
 # Load .env once at the top
 load_dotenv()
  
 router = APIRouter()
  
-# Initialize services
-file_service = FileService()
-embedding_service = EmbeddingService()
-responder = Responsellm()
+# Services are built on first use (or by warm_up_services at startup) so
+# importing this module does not load the model or open Snowflake connections
+file_service = LazyService(FileService)
+embedding_service = LazyService(EmbeddingService)
+responder = LazyService(Responsellm)
+ingestion_queue = IngestionQueue(file_service, embedding_service)
+ 
+ 
+async def warm_up_services():
+    """Build the services and run one query encode and rerank so the first request is not cold"""
+    await asyncio.to_thread(file_service.get)
+    await asyncio.to_thread(embedding_service.get)
+    await asyncio.to_thread(responder.get)
+    await embedding_service._embed_query("warm up")
+    await embedding_service.reranker.warm_up()
+ 
  
 # Add cleanup request model
  
@@ -74,44 +95,119 @@ async def chat(payload: ChatRequest):
         return JSONResponse(status_code=500, content={"error": str(e)})
  
  
-@router.post("/upload-document")
-async def upload_document(file: UploadFile = File(...)):
-    try:
-        # Generate a unique document ID
-        doc_id = str(uuid.uuid4())
+async def _chat_events(payload: ChatRequest):
+    """Token events for one chat turn, then a done event with sources and session info"""
+    async for event in responder.stream_response(
+        transcript=payload.user_message,
+        system_prompt=payload.system_prompt,
+        model=payload.model,
+        temperature=payload.temperature,
+        top_p=payload.top_p,
+        document_mode=payload.document_mode
+    ):
+        if event["type"] == "done":
+            event["result"]["session_info"] = embedding_service.session_manager.get_session_summary()
+        yield jsonable_encoder(event)
+ 
+ 
+@router.post("/chat/stream")
+async def chat_stream(payload: ChatRequest):
+    """Server-Sent Events version of /chat: `token` events, then a trailing `done` event"""
+    async def event_source():
+        try:
+            async for event in _chat_events(payload):
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        except Exception as e:
+            traceback.print_exc()
+            yield f"event: error\ndata: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
+ 
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+ 
  
-        # Upload file and process
-        result = await file_service.upload_file(file, doc_id)
+@router.websocket("/chat/ws")
+async def chat_websocket(websocket: WebSocket):
+    """WebSocket chat: each ChatRequest message is answered with token events and a done event"""
+    await websocket.accept()
+    try:
+        while True:
+            data = await websocket.receive_json()
+            try:
+                payload = ChatRequest(**data)
+            except ValidationError as e:
+                await websocket.send_json({"type": "error", "error": str(e)})
+                continue
+ 
+            try:
+                async for event in _chat_events(payload):
+                    await websocket.send_json(event)
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                traceback.print_exc()
+                await websocket.send_json({"type": "error", "error": str(e)})
+    except WebSocketDisconnect:
+        print("🔌 Chat WebSocket disconnected")
  
-        # Process document for embeddings
-        if result.get("success"):
-            embedding_result = await embedding_service.process_document(
-                doc_id=doc_id,
-                text_content=result["text_content"]
-            )
-            result["embedding_result"] = embedding_result
  
+@router.post("/upload-document")
+async def upload_document(file: UploadFile = File(...), background: bool = Query(False)):
+    """Upload a document; with ?background=true return a job id right away (202)"""
+    try:
+        file_content = await file.read()
+        file_service.validate_upload(file.filename, file_content)
+
+        # Upload, extraction and embedding run on the ingestion worker pool
+        job = ingestion_queue.submit(file_content, file.filename, file.content_type)
+
+        if background:
+            return JSONResponse(status_code=202, content=job)
+
+        job = await ingestion_queue.wait(job["job_id"])
+        if job["status"] == "failed" and job["result"] is None:
+            return JSONResponse(status_code=500, content={"error": job["error"], "job_id": job["job_id"]})
+
+        result = job["result"]
+        result["job_id"] = job["job_id"]
         return result
+    except HTTPException as e:
+        return JSONResponse(status_code=e.status_code, content={"error": e.detail})
     except Exception as e:
         traceback.print_exc()
         return JSONResponse(status_code=500, content={"error": str(e)})
  
  
+@router.get("/upload-jobs/{job_id}")
+async def get_upload_job(job_id: str):
+    """Get the status and progress of a background upload"""
+    job = ingestion_queue.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Upload job not found")
+    return job
+ 
+ 
+@router.get("/upload-jobs")
+async def list_upload_jobs():
+    """List recent upload jobs and worker pool usage"""
+    return {"jobs": ingestion_queue.list_jobs(), **ingestion_queue.stats()}
+ 
+ 
 @router.get("/documents")
 async def get_documents():
     try:
-        # Get documents from Snowflake
-        conn = file_service.get_snowflake_connection()
-        cursor = conn.cursor()
- 
-        cursor.execute("""
+        # Get documents from Snowflake without blocking the event loop
+        rows = await async_db.fetchall("""
             SELECT doc_id, filename, file_type, upload_timestamp, status
             FROM documents
             ORDER BY upload_timestamp DESC
         """)
  
         documents = []
-        for row in cursor.fetchall():
+        for row in rows:
             documents.append({
                 "doc_id": row[0],
                 "filename": row[1],
@@ -120,7 +216,6 @@ async def get_documents():
                 "status": row[4]
             })
  
-        conn.close()
         return {"documents": documents}
  
     except Exception as e:
@@ -132,11 +227,9 @@ async def get_documents():
 async def cleanup_session(payload: CleanupSessionRequest):
     """Clean up a specific session and delete all associated data"""
     try:
-        # Use the existing connection from embedding service
+        # Connections come from the shared Snowflake pool
         result = embedding_service.session_manager.cleanup_session(
-            payload.session_id,
-            embedding_service.snowflake_conn
-        )
+            payload.session_id)
         return result
     except Exception as e:
         traceback.print_exc()
@@ -147,10 +240,8 @@ async def cleanup_session(payload: CleanupSessionRequest):
 async def cleanup_all_sessions():
     """Clean up all sessions (for testing/debugging)"""
     try:
-        # Use the existing connection from embedding service
-        result = embedding_service.session_manager.cleanup_all_sessions(
-            embedding_service.snowflake_conn
-        )
+        # Connections come from the shared Snowflake pool
+        result = embedding_service.session_manager.cleanup_all_sessions()
         return result
     except Exception as e:
         traceback.print_exc()
@@ -201,6 +292,51 @@ async def clear_session():
         raise HTTPException(status_code=500, detail=str(e))
  
  
+@router.get("/embedding-cache/stats")
+async def get_embedding_cache_stats():
+    """Get hit/miss counters and memory usage of the session embedding cache"""
+    try:
+        return embedding_cache.stats()
+    except Exception as e:
+        traceback.print_exc()
+        return JSONResponse(status_code=500, content={"error": str(e)})
+ 
+ 
+@router.get("/query-embedding-cache/stats")
+async def get_query_embedding_cache_stats():
+    """Get hit rate and memory usage of the query embedding cache"""
+    return query_embedding_cache.stats()
+ 
+ 
+@router.get("/bm25-index/stats")
+async def get_bm25_index_stats():
+    """Get document count, postings size and hit rate of the in-memory BM25 indexes"""
+    return bm25_indexes.stats()
+ 
+ 
+@router.get("/snowflake-pool/stats")
+async def get_snowflake_pool_stats():
+    """Get checkout, reuse and eviction counters of the shared Snowflake pool"""
+    return snowflake_pool.stats()
+ 
+ 
+@router.get("/inference/stats")
+async def get_inference_stats():
+    """Get queue depth, wait and run times of the inference and Snowflake executors"""
+    stats = executor_stats()
+    if embedding_service.loaded:
+        stats["query_batcher"] = embedding_service.query_batcher.stats()
+    return stats
+ 
+ 
+@router.get("/intent/stats")
+async def get_intent_stats():
+    """Get how chat intents were decided (rules, embedding, LLM escalation)"""
+    if not responder.loaded:
+        return {"classified": 0, "loaded": False}
+    return responder.intent_classifier.stats()
+ 
+ 
 @router.get("/plugins/download/{plugin_id}")
 async def download_plugin(plugin_id: str):
     base_dir = os.path.dirname(__file__)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Recall and latency of RETRIEVAL_BACKEND=ann against the local exact backend
+
+Sessions are made of documents with realistic chunk counts (a few hundred
+each by default). Both backends answer the same queries through
+.search(); documents are served from memory instead of shards or
+Snowflake, so only the in-process search path is measured. The first
+ANN query of a session builds its index and is reported separately.
+
+Usage (from the Backend directory):
+  python -m benchmarks.ann_recall
+  python -m benchmarks.ann_recall --docs 1 5 20 60 --min-chunks 100 --max-chunks 600 --k 50
+"""
+
+import argparse
+import time
+import numpy as np
+
+from services.ann_index import ANN_MIN_CHUNKS, hnswlib
+from services.embedding_cache import embedding_cache
+from services.retrieval_backends import ANNBackend, LocalMatrixBackend
+from services.vector_search import top_k_indices
+
+
+def make_corpus(n: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """Clustered unit vectors, closer to real chunk embeddings than uniform noise"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    vectors = centers[labels] + 0.35 * rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_documents(count: int, args, seed: int):
+    rng = np.random.default_rng(seed)
+    documents = {}
+    for d in range(count):
+        n = int(rng.integers(args.min_chunks, args.max_chunks + 1))
+        matrix = make_corpus(n, args.dim, args.clusters, seed + d)
+        chunks = [{"text": f"doc{d}-chunk{i}", "metadata": {}, "filename": f"doc{d}.pdf"}
+                  for i in range(n)]
+        documents[f"doc-{seed}-{d}"] = (matrix, chunks)
+    return documents
+
+
+def in_memory(backend_cls, documents, **kwargs):
+    """The backend with load_document served from the given documents"""
+    class InMemoryBackend(backend_cls):
+        def load_document(self, doc_id):
+            return documents[doc_id]
+    return InMemoryBackend(None, **kwargs)
+
+
+def time_queries(search, queries, k):
+    results = []
+    start = time.perf_counter()
+    for q in queries:
+        results.append(search(q, k))
+    return results, (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", nargs="+", type=int, default=[1, 5, 20, 60],
+                        help="documents per session to try")
+    parser.add_argument("--min-chunks", type=int, default=100)
+    parser.add_argument("--max-chunks", type=int, default=600)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    if hnswlib is None:
+        print("⚠️ hnswlib is not installed; the ann backend uses exact indexes only")
+
+    queries = make_corpus(args.queries, args.dim, args.clusters, args.seed - 1)
+    print(f"📊 {args.queries} queries, k={args.k}, HNSW from {ANN_MIN_CHUNKS} chunks per session")
+    print(f"   {'docs':>5}{'chunks':>8}{'index':>7}{'build ms':>10}{'local ms':>10}{'ann ms':>8}{'recall':>8}")
+
+    for count in args.docs:
+        documents = make_documents(count, args, args.seed + 1000 * count)
+        doc_ids = list(documents)
+        session_id = f"bench-{count}"
+
+        local = in_memory(LocalMatrixBackend, documents)
+        ann = in_memory(ANNBackend, documents, dimension=args.dim, candidates=args.k)
+
+        def local_search(q, k):
+            chunks, scores = local.search(session_id, doc_ids, q)
+            return [chunks[i]["text"] for i in top_k_indices(scores, k).tolist()]
+
+        def ann_search(q, k):
+            chunks, _ = ann.search(session_id, doc_ids, q, k)
+            return [chunk["text"] for chunk in chunks]
+
+        local_search(queries[0], args.k)  # fill the session matrix cache
+        start = time.perf_counter()
+        ann_search(queries[0], args.k)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        exact, local_ms = time_queries(local_search, queries, args.k)
+        approx, ann_ms = time_queries(ann_search, queries, args.k)
+        recall = np.mean([len(set(a) & set(e)) / max(len(e), 1) for a, e in zip(approx, exact)])
+
+        total = sum(len(chunks) for _, chunks in documents.values())
+        kind = ann._sessions[session_id].index.kind
+        print(f"   {count:>5}{total:>8}{kind:>7}{build_ms:>10.1f}{local_ms:>10.3f}{ann_ms:>8.3f}{recall:>8.4f}")
+        embedding_cache.invalidate_session(session_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Concurrent async_db queries against a saturated Snowflake pool
+
+Fires more async_db queries than the pool has connections plus the
+snowflake-io lane has workers, while blocking jobs on that lane check out
+connections of their own. Every query holds its connection for --hold
+seconds (SYSTEM$WAIT). All of them must finish: a query holding a
+connection has to be able to poll even while every snowflake-io worker
+is parked waiting for a pool slot. Exits non-zero on any failure or
+checkout timeout.
+
+Usage (from the Backend directory, with Snowflake credentials in the env):
+  python -m benchmarks.async_db_contention
+  python -m benchmarks.async_db_contention --queries 32 --blocking 8 --hold 2
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+
+from services.async_db import async_db
+from services.inference_executor import db_executor, executor_stats
+from utils.snowflake_pool import snowflake_pool
+
+
+def blocking_wait(hold: float):
+    """What ingestion and BM25 cold loads do: a pool checkout inside a snowflake-io job"""
+    with snowflake_pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT SYSTEM$WAIT(%s)", (hold,))
+        return cursor.fetchone()
+
+
+async def run(args) -> int:
+    start = time.perf_counter()
+    jobs = [async_db.fetchone("SELECT SYSTEM$WAIT(%s)", (args.hold,), timeout=args.timeout)
+            for _ in range(args.queries)]
+    jobs += [db_executor.run(blocking_wait, args.hold) for _ in range(args.blocking)]
+    results = await asyncio.gather(*jobs, return_exceptions=True)
+    elapsed = time.perf_counter() - start
+
+    failures = [r for r in results if isinstance(r, BaseException)]
+    pool = snowflake_pool.stats()
+    print(f"📊 {args.queries} async queries + {args.blocking} blocking checkouts, "
+          f"pool {pool['max_size']}, snowflake-io workers {db_executor.max_workers}")
+    print(f"   finished in {elapsed:.1f}s "
+          f"(ideal {(args.queries + args.blocking) / pool['max_size'] * args.hold:.1f}s)")
+    print(f"   failed: {len(failures)}, checkout timeouts: {pool['checkout_timeouts']}")
+    for failure in failures[:5]:
+        print(f"   ❌ {type(failure).__name__}: {failure}")
+    for lane, stats in executor_stats().items():
+        if lane.startswith("snowflake"):
+            print(f"   {lane}: {stats}")
+
+    snowflake_pool.close_all()
+    return 1 if failures or pool["checkout_timeouts"] else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=24,
+                        help="concurrent async_db queries (default exceeds pool size + snowflake-io workers)")
+    parser.add_argument("--blocking", type=int, default=8,
+                        help="concurrent blocking checkouts on the snowflake-io lane")
+    parser.add_argument("--hold", type=float, default=2.0,
+                        help="seconds each query holds its connection")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Throughput, memory and cosine agreement of the encoder backends
+
+Each backend runs in its own subprocess so resident memory is measured
+from a clean interpreter. Agreement is the cosine between each backend's
+embeddings and the PyTorch embeddings of the same sentences.
+
+Usage (from the Backend directory):
+  python -m benchmarks.encoder_backends
+  python -m benchmarks.encoder_backends --backends torch onnx_int8 --sentences 2000 --batch-size 64
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+import tempfile
+import numpy as np
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+
+def make_sentences(n: int, seed: int):
+    """Chunk-like sentences of varying length from a small vocabulary"""
+    rng = np.random.default_rng(seed)
+    vocab = ("model retrieval document table figure results method patient dose "
+             "accuracy baseline dataset training evaluation protocol sample cohort "
+             "analysis significant increase decrease compared observed").split()
+    return [" ".join(rng.choice(vocab, size=rng.integers(8, 120))) for _ in range(n)]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_child(args):
+    """Load one backend, encode the corpus and write stats plus embeddings"""
+    from services.encoder_backends import load_sentence_encoder
+
+    sentences = make_sentences(args.sentences, args.seed)
+    baseline_mb = peak_rss_mb()
+
+    start = time.perf_counter()
+    model = load_sentence_encoder(MODEL_NAME, args.child)
+    load_s = time.perf_counter() - start
+
+    # Warm-up pass so one-time graph setup is not timed
+    model.encode(sentences[:args.batch_size], batch_size=args.batch_size)
+
+    start = time.perf_counter()
+    embeddings = model.encode(sentences, batch_size=args.batch_size,
+                              normalize_embeddings=True, convert_to_numpy=True)
+    encode_s = time.perf_counter() - start
+
+    np.save(args.output + ".npy", np.asarray(embeddings, dtype=np.float32))
+    with open(args.output + ".json", "w") as f:
+        json.dump({
+            "requested": args.child,
+            "backend": model.encoder_backend,
+            "load_s": load_s,
+            "sentences_per_s": len(sentences) / encode_s,
+            "peak_rss_mb": peak_rss_mb(),
+            "model_rss_mb": peak_rss_mb() - baseline_mb,
+        }, f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx_int8"])
+    parser.add_argument("--sentences", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    from services.encoder_backends import cosine_agreement
+
+    backends = args.backends if "torch" in args.backends else ["torch"] + args.backends
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in backends:
+            output = os.path.join(tmp, backend)
+            subprocess.run([
+                sys.executable, "-m", "benchmarks.encoder_backends",
+                "--child", backend, "--output", output,
+                "--sentences", str(args.sentences),
+                "--batch-size", str(args.batch_size),
+                "--seed", str(args.seed),
+            ], check=True)
+            with open(output + ".json") as f:
+                results[backend] = json.load(f)
+            results[backend]["embeddings"] = np.load(output + ".npy")
+
+    reference = results["torch"]["embeddings"]
+    torch_rate = results["torch"]["sentences_per_s"]
+
+    print(f"📊 {MODEL_NAME}, {args.sentences} sentences, batch size {args.batch_size}")
+    print(f"   {'backend':<12}{'ran as':<12}{'sent/s':>10}{'speedup':>9}{'load s':>8}"
+          f"{'peak MB':>9}{'model MB':>10}{'mean cos':>10}{'min cos':>9}")
+    for backend, stats in results.items():
+        agreement = cosine_agreement(stats["embeddings"], reference)
+        print(f"   {backend:<12}{stats['backend']:<12}{stats['sentences_per_s']:>10.1f}"
+              f"{stats['sentences_per_s'] / torch_rate:>8.2f}x{stats['load_s']:>8.2f}"
+              f"{stats['peak_rss_mb']:>9.0f}{stats['model_rss_mb']:>10.0f}"
+              f"{agreement['mean_cosine']:>10.4f}{agreement['min_cosine']:>9.4f}")
+
+
+if __name__ == "__main__":
+    main()
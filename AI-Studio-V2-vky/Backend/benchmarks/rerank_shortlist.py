@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Answer quality and rerank cost of the cosine shortlist in front of the reranker
+
+Every question is first reranked over all chunks; that top-k is the
+reference context the LLM would see. Each shortlist setting (size and
+cut) is then scored by how much of the reference context it still
+recovers (recall@k, top-1 agreement) against the pairs it sends to the
+reranker and the rerank wall time. With --hybrid every setting is also
+run with BM25 hits fused in by reciprocal rank, at the same size. The
+reranker is the one selected by RERANKER_BACKEND; its score cache is
+cleared before every run.
+
+Input files:
+  --chunks     JSONL, one {"text": ..., "filename": ..., "metadata": {...}} per line
+               (e.g. exported from document_chunks for one session)
+  --questions  plain text, one question per line
+
+Usage (from the Backend directory):
+  python -m benchmarks.rerank_shortlist --chunks chunks.jsonl --questions questions.txt
+  python -m benchmarks.rerank_shortlist --chunks chunks.jsonl --questions questions.txt \\
+      --sizes 20 50 100 --cuts none elbow --top-k 5 --hybrid
+"""
+
+import json
+import time
+import asyncio
+import argparse
+import numpy as np
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+
+def load_chunks(path: str):
+    chunks = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                chunks.append({
+                    "text": row["text"],
+                    "filename": row.get("filename", "unknown"),
+                    "metadata": row.get("metadata") or {},
+                })
+    return chunks
+
+
+def load_questions(path: str):
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+async def rerank(reranker, question, chunks, similarities, indices, top_k):
+    """Rerank the given chunk indices; returns (top-k chunk ids, seconds)"""
+    from services.embedding_cache import rerank_score_cache
+
+    passages = [dict(chunks[i], chunk_id=int(i), base_score=float(similarities[i]))
+                for i in indices]
+    rerank_score_cache.clear()
+    start = time.perf_counter()
+    results = await reranker.batch_rerank(question, passages, top_k)
+    elapsed = time.perf_counter() - start
+    return [result["passage"]["chunk_id"] for result in results], elapsed
+
+
+async def run(args):
+    from services.encoder_backends import get_sentence_encoder
+    from services.reranker import RerankerService
+    from services.vector_search import shortlist_indices
+    from services.bm25_index import BM25Document, bm25_search, reciprocal_rank_fusion
+
+    chunks = load_chunks(args.chunks)
+    questions = load_questions(args.questions)
+    encoder = get_sentence_encoder(MODEL_NAME)
+    reranker = RerankerService()
+    lexical_index = BM25Document(chunks)
+    positions = {id(chunk): i for i, chunk in enumerate(chunks)}
+
+    matrix = np.asarray(encoder.encode([c["text"] for c in chunks], batch_size=64,
+                                       normalize_embeddings=True, convert_to_numpy=True,
+                                       show_progress_bar=False), dtype=np.float32)
+    queries = np.asarray(encoder.encode(questions, normalize_embeddings=True,
+                                        convert_to_numpy=True, show_progress_bar=False),
+                         dtype=np.float32)
+
+    modes = ["dense", "hybrid"] if args.hybrid else ["dense"]
+    settings = [(size, cut, mode) for size in args.sizes for cut in args.cuts for mode in modes]
+    totals = {setting: {"recall": 0.0, "top1": 0, "pairs": 0, "seconds": 0.0} for setting in settings}
+    reference_seconds = 0.0
+
+    for question, query in zip(questions, queries):
+        similarities = matrix @ query
+        everything = np.argsort(-similarities)
+        reference, seconds = await rerank(reranker, question, chunks, similarities, everything, args.top_k)
+        reference_seconds += seconds
+
+        if args.hybrid:
+            matched, _ = bm25_search([lexical_index], question, args.bm25_candidates)
+            lexical = [positions[id(chunk)] for chunk in matched]
+
+        for size, cut, mode in settings:
+            indices = shortlist_indices(similarities, max(size, args.top_k) if size > 0 else len(chunks),
+                                        min_keep=max(args.top_k, args.min_keep), cut=cut, gap=args.gap)
+            if mode == "hybrid" and lexical:
+                fused = reciprocal_rank_fusion([indices.tolist(), lexical], k=args.rrf_k)
+                indices = np.asarray([i for i, _ in fused[:max(len(indices), args.top_k)]])
+            selected, seconds = await rerank(reranker, question, chunks, similarities, indices, args.top_k)
+            stats = totals[(size, cut, mode)]
+            stats["recall"] += len(set(selected) & set(reference)) / max(len(reference), 1)
+            stats["top1"] += int(bool(selected) and bool(reference) and selected[0] == reference[0])
+            stats["pairs"] += len(indices)
+            stats["seconds"] += seconds
+
+    n = len(questions)
+    print(f"📊 {len(chunks)} chunks, {n} questions, top_k {args.top_k}, "
+          f"reranker {reranker.scorer_id}")
+    print(f"   full rerank: {len(chunks)} pairs, {reference_seconds / n * 1000:.0f} ms per question")
+    print(f"   {'size':>6}{'cut':>7}{'mode':>8}{'recall@k':>10}{'top-1':>8}{'pairs':>8}{'ms':>8}{'speedup':>9}")
+    for (size, cut, mode), stats in totals.items():
+        ms = stats["seconds"] / n * 1000
+        print(f"   {size or 'all':>6}{cut:>7}{mode:>8}{stats['recall'] / n:>10.3f}{stats['top1'] / n:>8.3f}"
+              f"{stats['pairs'] / n:>8.0f}{ms:>8.0f}{reference_seconds / max(stats['seconds'], 1e-9):>8.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", required=True)
+    parser.add_argument("--questions", required=True)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10, 20, 50, 100],
+                        help="shortlist sizes to try (0 = all chunks)")
+    parser.add_argument("--cuts", nargs="+", default=["none", "gap", "elbow"],
+                        choices=["none", "gap", "elbow"])
+    parser.add_argument("--gap", type=float, default=0.08)
+    parser.add_argument("--min-keep", type=int, default=10)
+    parser.add_argument("--hybrid", action="store_true",
+                        help="also fuse BM25 hits into each shortlist")
+    parser.add_argument("--bm25-candidates", type=int, default=50)
+    parser.add_argument("--rrf-k", type=int, default=60)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
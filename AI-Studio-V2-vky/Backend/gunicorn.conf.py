@@ -0,0 +1,24 @@
+# Opt-in gunicorn deployment with preloaded model weights:
+#   gunicorn main:app -c gunicorn.conf.py
+# The Dockerfile still runs uvicorn directly; use this config instead when
+# the encoder should be loaded in a master process (see main.preload_models).
+#
+# Defaults to ONE worker. Sessions (DocumentSessionManager), upload jobs
+# (IngestionQueue), the BM25/ANN indexes and every cache live in process
+# memory, so with WEB_CONCURRENCY > 1 an upload-job poll or a chat request
+# can land on a worker that has never seen the session or job and 404 or
+# miss the document. Raise it only behind sticky sessions routing each
+# client to one worker.
+#
+# With several workers the app (and encoder) is imported once in the master;
+# forked workers share those pages copy-on-write instead of each loading its
+# own copy.
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+
+os.environ.setdefault("PRELOAD_MODELS", "true")
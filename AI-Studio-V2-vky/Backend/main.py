@@ -1,6 +1,7 @@
+from utils.startup_timing import startup_timer
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from api.routes import router as chat_router
+from api.routes import router as chat_router, warm_up_services
 from api.analytics import router as analytics_router
 from api.auth import router as auth_router
 from fastapi.staticfiles import StaticFiles
@@ -12,18 +13,37 @@ from api.tts_route import app as tts_app
 from utils.logger import setup_logger
 from services.api_usage_tracker import APIUsageTracker, APIUsageMiddleware
 from routes.export import router as export_router
-from huggingface_hub import login
-
-hf_token = os.getenv("HF_TOKEN")
-if hf_token:
-    login(token=hf_token)
-    print("✅ Hugging Face token loaded")
-else:
-    print("⚠️ HF_TOKEN not set")
-    
-    
+import gc
+
+startup_timer.mark("module imports")
+
+
+def preload_models():
+    """Load the encoder weights in the gunicorn master before workers fork.
+
+    Workers inherit the weights copy-on-write. gc.freeze() moves everything
+    loaded so far out of the collector's generations so GC passes in the
+    workers do not touch, and thereby copy, those pages. No forward pass runs
+    here because torch thread pools do not survive fork; each worker warms
+    up in its own startup hook. The Hugging Face login happens with the
+    first encoder load (see services/encoder_backends.huggingface_login).
+    """
+    from services.embedding_service import EMBEDDING_MODEL_NAME
+    from services.encoder_backends import get_sentence_encoder, get_cross_encoder
+    from services.reranker import RERANKER_BACKEND, CROSS_ENCODER_MODEL, CROSS_ENCODER_BACKEND
+    get_sentence_encoder(EMBEDDING_MODEL_NAME)
+    if RERANKER_BACKEND == "cross_encoder":
+        get_cross_encoder(CROSS_ENCODER_MODEL, CROSS_ENCODER_BACKEND)
+    gc.freeze()
+    print("✅ Encoders preloaded for forked workers")
+
+
 load_dotenv()
 
+# Set by gunicorn.conf.py (preload_app) so the master loads weights once
+if os.getenv("PRELOAD_MODELS", "false").lower() == "true":
+    preload_models()
+
 # Get URL configuration with fallback
 url = os.getenv("URL")
 parsed_url = urlparse(url)
@@ -58,11 +78,35 @@ async def startup_event():
 
     try:
         from utils.snowflake_setup import create_api_usage_table
-        create_api_usage_table()
+        with startup_timer.phase("analytics table check"):
+            create_api_usage_table()
         print("✅ Analytics database ready")
     except Exception as e:
         print(f"⚠️  Analytics database setup warning: {e}")
 
+    from utils.schema_check import has_content_hash_columns
+    with startup_timer.phase("schema check"):
+        if has_content_hash_columns():
+            print("✅ content_hash columns present")
+
+    # Optional: build services and encode once now instead of on the first request
+    if os.getenv("WARMUP_ON_STARTUP", "false").lower() == "true":
+        try:
+            with startup_timer.phase("service warm-up"):
+                await warm_up_services()
+            print("✅ Services warmed up")
+        except Exception as e:
+            print(f"⚠️  Service warm-up failed, services will load on first use: {e}")
+
+    startup_timer.print_report()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    from utils.snowflake_pool import snowflake_pool
+    snowflake_pool.close_all()
+    print("🔌 Snowflake connections closed")
+
 
 # CORS Configuration - MUST come before routes
 app.add_middleware(
@@ -101,6 +145,12 @@ def root():
     return {"message": "AI Studio V2 is running", "status": "ok"}
 
 
+@app.get("/startup-report")
+def startup_report():
+    """Boot time broken down by phase, including lazily loaded services"""
+    return startup_timer.report()
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -25,31 +25,34 @@ async def reprocess_document(doc_id: str, filename: str, s3_key: str):
         response = s3_client.get_object(Bucket=bucket_name, Key=s3_key)
         file_content = response['Body'].read()
         
-        # Determine file type
-        file_type = filename.split('.')[-1].lower() if '.' in filename else 'unknown'
-        
-        # Initialize embedding service
+        # Initialize services
         embedding_service = EmbeddingService()
+        file_service = FileService()
+        
+        # Extract page-aware text the same way uploads do
+        text_content = await file_service._extract_text(file_content, filename, doc_id=doc_id)
         
-        # Delete existing chunks for this document
+        # Remember the existing chunks; they stay in place while reprocessing
+        # so unchanged chunks reuse their stored vectors by content hash, and
+        # are only replaced once every new chunk is stored
         conn = get_snowflake_connection()
         cursor = conn.cursor()
-        cursor.execute("DELETE FROM document_chunks WHERE doc_id = %s", (doc_id,))
-        conn.commit()
+        cursor.execute("SELECT chunk_id FROM document_chunks WHERE doc_id = %s", (doc_id,))
+        old_chunk_ids = [row[0] for row in cursor.fetchall()]
         conn.close()
         
-        print(f"🗑️ Deleted old chunks for {filename}")
-        
-        # Reprocess with page-aware method
-        result = await embedding_service.process_document_with_pages(
+        # Reprocess with page-aware chunking and bulk chunk insertion
+        result = await embedding_service.process_document(
             doc_id=doc_id,
-            file_content=file_content,
-            file_type=file_type,
-            filename=filename
+            text_content=text_content,
+            replace_chunk_ids=old_chunk_ids
         )
         
-        print(f"✅ Reprocessed {filename}: {result['chunks_created']} chunks across {result['pages_processed']} pages")
-        return True
+        for failed_batch in result.get("failed_batches", []):
+            print(f"⚠️ Batch {failed_batch['batch']} (chunks {failed_batch['first_chunk_index']}-{failed_batch['last_chunk_index']}) failed: {failed_batch['error']}")
+        
+        print(f"✅ Reprocessed {filename}: {result['chunks_created']} chunks stored ({result['chunks_reused']} reused), {result['chunks_failed']} failed")
+        return result["status"] == "processed"
         
     except Exception as e:
         print(f"❌ Error reprocessing {filename}: {e}")
@@ -1,8 +1,8 @@
 import json
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
-import snowflake.connector
-from utils.snowflake_setup import get_snowflake_config
+from utils.snowflake_pool import snowflake_pool
+from services.embedding_cache import embedding_cache, query_embedding_cache, rerank_score_cache
 from utils.logger import get_logger
  
 logger = get_logger("analytics_service")
@@ -11,16 +11,10 @@ logger = get_logger("analytics_service")
 class AnalyticsService:
     """Service for querying and aggregating API usage analytics"""
  
-    def __init__(self):
-        self.snowflake_config = get_snowflake_config()
- 
     def get_connection(self):
-        """Get a Snowflake connection with timeout"""
+        """Check out a pooled Snowflake connection (close() returns it)"""
         try:
-            config = self.snowflake_config.copy()
-            config['connect_timeout'] = 10
-            config['network_timeout'] = 10
-            return snowflake.connector.connect(**config)
+            return snowflake_pool.acquire()
         except Exception as e:
             logger.error(f"Failed to connect to Snowflake: {e}")
             raise
@@ -291,6 +285,14 @@ class AnalyticsService:
             if conn:
                 conn.close()
  
+    def get_cache_metrics(self) -> Dict[str, Any]:
+        """Hit ratios of this worker's in-process retrieval caches"""
+        return {
+            'rerankScores': rerank_score_cache.stats(),
+            'queryEmbeddings': query_embedding_cache.stats(),
+            'sessionEmbeddings': embedding_cache.stats(),
+        }
+ 
     def get_real_time_metrics(self, user_id: str = None) -> Dict[str, Any]:
         """Get real-time metrics for WebSocket streaming for a specific user"""
         try:
@@ -315,6 +317,7 @@ class AnalyticsService:
                 'metrics': metrics,
                 'modelDistribution': model_distribution,
                 'usageSeries': usage_series,
+                'cacheMetrics': self.get_cache_metrics(),
                 'timestamp': datetime.now().isoformat()
             }
  
@@ -332,5 +335,6 @@ class AnalyticsService:
                 },
                 'modelDistribution': [],
                 'usageSeries': {'7D': [], '30D': [], '90D': [], '1Y': []},
+                'cacheMetrics': self.get_cache_metrics(),
                 'timestamp': datetime.now().isoformat()
             }
\ No newline at end of file
@@ -0,0 +1,100 @@
+import os
+import numpy as np
+from typing import Tuple
+
+from services.vector_search import normalize_vector, top_k_indices
+
+try:
+    import hnswlib
+except ImportError:  # Optional dependency; exact search is used without it
+    hnswlib = None
+
+ANN_INDEX_KIND = os.getenv("ANN_INDEX", "hnsw").lower()
+# Below this many chunks in a session a linear scan (one matrix product) is
+# as fast as graph search
+ANN_MIN_CHUNKS = int(os.getenv("ANN_MIN_CHUNKS", "2000"))
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+
+
+class ExactIndex:
+    """Brute-force inner product over unit-length rows (the reference path)"""
+
+    kind = "exact"
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+        self.vectors = np.zeros((0, dimension), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def add(self, vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimension)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.vectors = np.ascontiguousarray(
+            np.vstack([self.vectors, vectors / norms]))
+
+    def query(self, query_vector, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (row ids, cosine scores) of the k nearest rows, best first"""
+        if len(self.vectors) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        scores = self.vectors @ normalize_vector(query_vector)
+        ids = top_k_indices(scores, k)
+        return ids, scores[ids]
+
+
+class HNSWIndex:
+    """hnswlib graph index; rows are normalized so inner product equals cosine"""
+
+    kind = "hnsw"
+
+    def __init__(self, dimension: int, capacity: int = 1024):
+        self.dimension = dimension
+        self.count = 0
+        self.index = hnswlib.Index(space="ip", dim=dimension)
+        self.index.init_index(
+            max_elements=max(capacity, 1), ef_construction=HNSW_EF_CONSTRUCTION, M=HNSW_M)
+        self.index.set_ef(HNSW_EF_SEARCH)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def add(self, vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimension)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors = vectors / norms
+
+        needed = self.count + len(vectors)
+        if needed > self.index.get_max_elements():
+            self.index.resize_index(max(needed, 2 * self.index.get_max_elements()))
+        self.index.add_items(vectors, np.arange(self.count, needed))
+        self.count = needed
+
+    def query(self, query_vector, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (row ids, cosine scores) of the approximate k nearest rows, best first"""
+        k = min(k, self.count)
+        if k == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        self.index.set_ef(max(HNSW_EF_SEARCH, k))
+        labels, distances = self.index.knn_query(normalize_vector(query_vector), k=k)
+        # hnswlib "ip" distance is 1 - dot product
+        return labels[0].astype(np.int64), (1.0 - distances[0]).astype(np.float32)
+
+
+def ann_index_kind(expected_size: int, kind: str = None) -> str:
+    """Index kind used for this many rows: HNSW for large sets when hnswlib is available"""
+    kind = (kind or ANN_INDEX_KIND).lower()
+    if kind == HNSWIndex.kind and hnswlib is not None and expected_size >= ANN_MIN_CHUNKS:
+        return HNSWIndex.kind
+    return ExactIndex.kind
+
+
+def create_ann_index(dimension: int, expected_size: int = 0, kind: str = None):
+    """Pick an index for a session's chunks (see ann_index_kind)"""
+    if ann_index_kind(expected_size, kind) == HNSWIndex.kind:
+        return HNSWIndex(dimension, capacity=expected_size)
+    return ExactIndex(dimension)
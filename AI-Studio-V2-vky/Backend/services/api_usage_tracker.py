@@ -12,9 +12,8 @@ from fastapi import Request, Response
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import Response as StarletteResponse
  
-import snowflake.connector
  
-from utils.snowflake_setup import get_snowflake_config
+from utils.snowflake_pool import snowflake_pool
 from utils.logger import get_logger
  
 logger = get_logger("api_usage_tracker")
@@ -55,8 +54,6 @@ def extract_user_id_from_request(request: Request) -> Optional[str]:
  
 class APIUsageTracker:
     def __init__(self):
-        self.snowflake_config = get_snowflake_config()
-        
         # Model cost estimation (tokens per dollar)
         self.model_costs = {
             'gpt-4': {'input': 0.03/1000, 'output': 0.06/1000},
@@ -66,7 +63,8 @@ class APIUsageTracker:
         }
  
     def get_connection(self):
-        return snowflake.connector.connect(**self.snowflake_config)
+        # Pooled: close() returns the connection instead of disconnecting
+        return snowflake_pool.acquire()
  
     async def log_api_usage(self, usage_data: Dict[str, Any]):
         """Log API usage data to Snowflake"""
@@ -143,7 +141,8 @@ class APIUsageMiddleware(BaseHTTPMiddleware):
         
         # Define which endpoints have LLM usage (model + tokens)
         self.llm_endpoints = {
-            "/api/chat"
+            "/api/chat",
+            "/api/chat/stream"
         }
  
     def _get_client_ip(self, request: Request) -> str:
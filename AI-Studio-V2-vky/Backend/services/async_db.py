@@ -0,0 +1,146 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Callable, List, Optional, Sequence
+
+from services.inference_executor import db_executor, db_async_executor
+from utils.snowflake_pool import snowflake_pool
+
+logger = logging.getLogger(__name__)
+
+SNOWFLAKE_QUERY_TIMEOUT = float(os.getenv("SNOWFLAKE_QUERY_TIMEOUT", "30"))
+# Status polling starts fast for short lookups and backs off for long scans
+ASYNC_POLL_MIN_SECONDS = 0.02
+ASYNC_POLL_MAX_SECONDS = 0.5
+# Waiting for a free pool slot, on the event loop
+CHECKOUT_POLL_MIN_SECONDS = 0.005
+CHECKOUT_POLL_MAX_SECONDS = 0.05
+
+
+class AsyncSnowflake:
+    """Awaitable Snowflake queries for coroutines.
+
+    Queries are submitted with cursor.execute_async and their status is
+    polled with asyncio.sleep in between, so no thread is parked while the
+    warehouse works and concurrent requests do not queue behind each
+    other's round trips. Waiting for a pool slot also happens on the event
+    loop; only opening the connection, submit, status checks and fetching
+    the result run on the snowflake-async lane, which never blocks on the
+    pool. A query that exceeds its timeout or whose caller is cancelled is
+    cancelled in Snowflake with SYSTEM$CANCEL_QUERY.
+    """
+
+    def __init__(self, pool=snowflake_pool, executor=db_async_executor,
+                 blocking_executor=db_executor, default_timeout: float = SNOWFLAKE_QUERY_TIMEOUT):
+        self.pool = pool
+        self.executor = executor
+        self.blocking_executor = blocking_executor
+        self.default_timeout = default_timeout
+
+    async def fetchall(self, sql: str, params: Sequence = None, timeout: float = None) -> List[tuple]:
+        return await self._query(sql, params, timeout, lambda cursor: cursor.fetchall())
+
+    async def fetchone(self, sql: str, params: Sequence = None, timeout: float = None) -> Optional[tuple]:
+        return await self._query(sql, params, timeout, lambda cursor: cursor.fetchone())
+
+    async def execute(self, sql: str, params: Sequence = None, timeout: float = None) -> int:
+        """Run a DML statement (autocommitted) and return the affected row count"""
+        return await self._query(sql, params, timeout, lambda cursor: cursor.rowcount)
+
+    async def run(self, fn: Callable, *args, timeout: float = None, **kwargs) -> Any:
+        """Run blocking database code (e.g. a SQLAlchemy query) on the snowflake-io lane.
+
+        On timeout the caller gets TimeoutError; the thread itself cannot be
+        interrupted and finishes in the background.
+        """
+        timeout = timeout or self.default_timeout
+        try:
+            return await asyncio.wait_for(self.blocking_executor.run(fn, *args, **kwargs), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Database call exceeded {timeout:.0f}s")
+
+    async def _acquire(self):
+        """Wait for a pool slot on the event loop, then open or reuse the connection on the lane"""
+        deadline = time.monotonic() + self.pool.checkout_timeout
+        poll = CHECKOUT_POLL_MIN_SECONDS
+        while not self.pool.reserve(0):
+            if time.monotonic() >= deadline:
+                self.pool.checkout_timed_out()
+            await asyncio.sleep(poll)
+            poll = min(poll * 2, CHECKOUT_POLL_MAX_SECONDS)
+
+        checkout = asyncio.ensure_future(self.executor.run(self.pool.checkout))
+        try:
+            return await asyncio.shield(checkout)
+        except asyncio.CancelledError:
+            # The checkout still completes; hand its connection straight back
+            checkout.add_done_callback(_close_abandoned_checkout)
+            raise
+
+    async def _query(self, sql: str, params: Optional[Sequence], timeout: Optional[float],
+                     fetch: Callable) -> Any:
+        timeout = timeout or self.default_timeout
+        deadline = time.monotonic() + timeout
+        conn = await self._acquire()
+        cursor = conn.cursor()
+
+        if not hasattr(cursor, "execute_async"):
+            # Connector without async submission: plain blocking execute on the lane
+            try:
+                await asyncio.wait_for(self.executor.run(cursor.execute, sql, params), timeout)
+                return await self.executor.run(fetch, cursor)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"Snowflake query exceeded {timeout:.0f}s")
+            finally:
+                conn.close()
+
+        sfqid = None
+        try:
+            await self.executor.run(cursor.execute_async, sql, params)
+            sfqid = cursor.sfqid
+
+            poll = ASYNC_POLL_MIN_SECONDS
+            while True:
+                try:
+                    status = await self.executor.run(conn.get_query_status_throw_if_error, sfqid)
+                except Exception:
+                    # The query itself failed; there is nothing left to cancel
+                    sfqid = None
+                    raise
+                if not conn.is_still_running(status):
+                    break
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"Snowflake query {sfqid} exceeded {timeout:.0f}s")
+                await asyncio.sleep(poll)
+                poll = min(poll * 2, ASYNC_POLL_MAX_SECONDS)
+
+            await self.executor.run(cursor.get_results_from_sfqid, sfqid)
+            result = await self.executor.run(fetch, cursor)
+            sfqid = None
+            return result
+        finally:
+            if sfqid is not None:
+                # Timed out, failed mid-poll or the request was cancelled:
+                # stop the warehouse work and release the connection afterwards
+                self.executor.executor.submit(self._cancel_and_release, conn, sfqid)
+            else:
+                conn.close()
+
+    @staticmethod
+    def _cancel_and_release(conn, sfqid: str):
+        try:
+            conn.cursor().execute("SELECT SYSTEM$CANCEL_QUERY(%s)", (sfqid,))
+            logger.warning(f"Cancelled Snowflake query {sfqid}")
+        except Exception as e:
+            logger.warning(f"Could not cancel Snowflake query {sfqid}: {e}")
+        finally:
+            conn.close()
+
+
+def _close_abandoned_checkout(checkout: "asyncio.Future"):
+    if not checkout.cancelled() and checkout.exception() is None:
+        checkout.result().close()
+
+
+async_db = AsyncSnowflake()
@@ -0,0 +1,194 @@
+import os
+import re
+import math
+import threading
+import unicodedata
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.vector_search import top_k_indices
+
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+# Per-document lexical indexes kept in memory before the least recently used is dropped
+BM25_MAX_DOCUMENTS = int(os.getenv("BM25_MAX_DOCUMENTS", "256"))
+
+# Words, numbers and joined identifiers such as il-6, covid-19, 3.5 or table_2
+TOKEN_PATTERN = re.compile(r"[^\W_]+(?:[.\-/_][^\W_]+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the "
+    "this to was were what which with does do did how why when where who can".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Casefolded terms; joined identifiers with letters are also indexed by their parts"""
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    terms = []
+    for token in TOKEN_PATTERN.findall(text):
+        if token not in STOPWORDS:
+            terms.append(token)
+        if not token.isalnum() and any(c.isalpha() for c in token):
+            terms.extend(part for part in re.split(r"[.\-/_]", token)
+                         if part and part not in STOPWORDS)
+    return terms
+
+
+class BM25Document:
+    """Inverted index of one document's chunks with postings in flat arrays.
+
+    Postings of term t are chunk_ids[offsets[t]:offsets[t + 1]] with the
+    matching term frequencies in tfs; only the vocabulary is a dict.
+    """
+
+    def __init__(self, chunks: List[Dict[str, Any]]):
+        self.chunks = chunks
+        vocabulary: Dict[str, int] = {}
+        term_ids, chunk_ids, tfs = [], [], []
+        lengths = np.zeros(len(chunks), dtype=np.float32)
+
+        for position, chunk in enumerate(chunks):
+            counts = Counter(tokenize(chunk.get("text", "")))
+            lengths[position] = sum(counts.values())
+            for term, tf in counts.items():
+                term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                chunk_ids.append(position)
+                tfs.append(tf)
+
+        term_ids = np.asarray(term_ids, dtype=np.int32)
+        order = np.argsort(term_ids, kind="stable")
+        self.vocabulary = vocabulary
+        self.chunk_ids = np.asarray(chunk_ids, dtype=np.int32)[order]
+        self.tfs = np.minimum(np.asarray(tfs, dtype=np.int32)[order], 65535).astype(np.uint16)
+        self.offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(vocabulary)), out=self.offsets[1:])
+        self.lengths = lengths
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.chunk_ids.nbytes + self.tfs.nbytes + self.offsets.nbytes + self.lengths.nbytes)
+
+    def document_frequency(self, term: str) -> int:
+        term_id = self.vocabulary.get(term)
+        return 0 if term_id is None else int(self.offsets[term_id + 1] - self.offsets[term_id])
+
+    def score(self, idf: Dict[str, float], avgdl: float,
+              k1: float = BM25_K1, b: float = BM25_B) -> np.ndarray:
+        """BM25 score of every chunk given collection-wide idf and average length"""
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        norm = k1 * (1.0 - b + b * self.lengths / max(avgdl, 1e-9))
+        for term, weight in idf.items():
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            postings = self.chunk_ids[start:end]
+            tf = self.tfs[start:end].astype(np.float32)
+            scores[postings] += weight * tf * (k1 + 1.0) / (tf + norm[postings])
+        return scores
+
+
+def bm25_search(documents: Sequence[BM25Document], query: str,
+                limit: int) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+    """Top chunks across several documents, scored with statistics of the whole set"""
+    terms = set(tokenize(query))
+    total_chunks = sum(len(doc) for doc in documents)
+    if not terms or total_chunks == 0:
+        return [], np.zeros(0, dtype=np.float32)
+
+    avgdl = float(sum(doc.lengths.sum() for doc in documents)) / total_chunks
+    idf = {}
+    for term in terms:
+        df = sum(doc.document_frequency(term) for doc in documents)
+        if df:
+            idf[term] = math.log(1.0 + (total_chunks - df + 0.5) / (df + 0.5))
+    if not idf:
+        return [], np.zeros(0, dtype=np.float32)
+
+    chunks = [chunk for doc in documents for chunk in doc.chunks]
+    scores = np.concatenate([doc.score(idf, avgdl) for doc in documents])
+    best = [i for i in top_k_indices(scores, limit).tolist() if scores[i] > 0]
+    return [chunks[i] for i in best], scores[best]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Hashable]], k: int = 60) -> List[Tuple[Hashable, float]]:
+    """Fuse ranked key lists by sum(1 / (k + rank)); best first"""
+    fused: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25IndexStore:
+    """Per-document BM25 indexes, built at ingestion and kept in an LRU.
+
+    Documents evicted or never indexed in this process are rebuilt on first
+    search through the `load_chunks(doc_id)` callback.
+    """
+
+    def __init__(self, max_documents: int = BM25_MAX_DOCUMENTS):
+        self.max_documents = max_documents
+        self._indexes: "OrderedDict[str, BM25Document]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.hits = 0
+        self.misses = 0
+
+    def build(self, doc_id: str, chunks: List[Dict[str, Any]]) -> BM25Document:
+        index = BM25Document(chunks)
+        with self._lock:
+            self._indexes.pop(doc_id, None)
+            self._indexes[doc_id] = index
+            self.builds += 1
+            while len(self._indexes) > self.max_documents:
+                self._indexes.popitem(last=False)
+        return index
+
+    def get(self, doc_id: str) -> Optional[BM25Document]:
+        with self._lock:
+            index = self._indexes.get(doc_id)
+            if index is None:
+                self.misses += 1
+                return None
+            self._indexes.move_to_end(doc_id)
+            self.hits += 1
+            return index
+
+    def delete(self, doc_id: str):
+        with self._lock:
+            self._indexes.pop(doc_id, None)
+
+    def search(self, doc_ids: List[str], query: str, limit: int,
+               load_chunks: Callable[[str], List[Dict[str, Any]]]) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+        """BM25 top `limit` chunks of the given documents (blocking on a cold build)"""
+        documents = []
+        for doc_id in doc_ids:
+            index = self.get(doc_id)
+            if index is None:
+                index = self.build(doc_id, load_chunks(doc_id))
+            documents.append(index)
+        return bm25_search(documents, query, limit)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "documents": len(self._indexes),
+                "max_documents": self.max_documents,
+                "chunks": sum(len(index) for index in self._indexes.values()),
+                "postings_bytes": sum(index.nbytes for index in self._indexes.values()),
+                "builds": self.builds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+# Shared by ingestion (build) and retrieval (search)
+bm25_indexes = BM25IndexStore()
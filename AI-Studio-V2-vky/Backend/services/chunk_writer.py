@@ -0,0 +1,73 @@
+import os
+import logging
+from typing import Dict, List, Tuple, Any
+
+from utils.schema_check import has_content_hash_columns
+
+logger = logging.getLogger(__name__)
+
+# Rows per executemany call; the connector rewrites each call into one multi-row INSERT
+CHUNK_INSERT_BATCH_SIZE = int(os.getenv("CHUNK_INSERT_BATCH_SIZE", "500"))
+
+INSERT_CHUNK_SQL = """
+    INSERT INTO document_chunks
+    (chunk_id, doc_id, chunk_text, chunk_index, embedding_vector, metadata, content_hash)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+"""
+
+# Schemas created before content_hash was added
+LEGACY_INSERT_CHUNK_SQL = """
+    INSERT INTO document_chunks
+    (chunk_id, doc_id, chunk_text, chunk_index, embedding_vector, metadata)
+    VALUES (%s, %s, %s, %s, %s, %s)
+"""
+
+
+def bulk_insert_chunks(conn, rows: List[Tuple[Any, ...]], batch_size: int = None) -> Dict[str, Any]:
+    """Insert document_chunks rows in multi-row batches and report failures per batch.
+
+    Each row is (chunk_id, doc_id, chunk_text, chunk_index, embedding_vector,
+    metadata, content_hash). A failed batch is rolled back on its own and does not stop the
+    remaining batches. Returns the positions of the rows that were stored and
+    a list describing each failed batch. Without the content_hash column the
+    hash is dropped from each row.
+    """
+    batch_size = batch_size or CHUNK_INSERT_BATCH_SIZE
+    insert_sql = INSERT_CHUNK_SQL
+    if not has_content_hash_columns():
+        insert_sql = LEGACY_INSERT_CHUNK_SQL
+        rows = [row[:6] for row in rows]
+    cursor = conn.cursor()
+    inserted_positions: List[int] = []
+    failed_batches: List[Dict[str, Any]] = []
+
+    for batch_number, start in enumerate(range(0, len(rows), batch_size), start=1):
+        batch = rows[start:start + batch_size]
+        try:
+            cursor.executemany(insert_sql, batch)
+            conn.commit()
+            inserted_positions.extend(range(start, start + len(batch)))
+            print(
+                f"Stored chunk batch {batch_number} ({start + len(batch)}/{len(rows)})")
+        except Exception as e:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            logger.error(
+                f"Chunk batch {batch_number} (rows {start}-{start + len(batch) - 1}) failed: {e}")
+            print(f"❌ Error inserting chunk batch {batch_number}: {e}")
+            failed_batches.append({
+                "batch": batch_number,
+                "first_chunk_index": batch[0][3],
+                "last_chunk_index": batch[-1][3],
+                "rows": len(batch),
+                "error": str(e),
+            })
+
+    return {
+        "inserted": len(inserted_positions),
+        "failed": len(rows) - len(inserted_positions),
+        "inserted_positions": inserted_positions,
+        "failed_batches": failed_batches,
+    }
@@ -0,0 +1,299 @@
+import os
+import re
+import time
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from services.vector_search import EmbeddingMatrix
+
+# Rough per-chunk overhead for the metadata dict and Python object headers
+CHUNK_OVERHEAD_BYTES = 512
+
+
+def normalize_text(text: str) -> str:
+    """Cache-key form of user text: NFKC, collapsed whitespace, casefolded"""
+    text = unicodedata.normalize("NFKC", text or "")
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+class SessionEmbeddingCache:
+    """Memory-bounded LRU + TTL cache of decoded session embeddings.
+
+    Entries are keyed by session_id and the set of doc_ids they were built
+    from, and hold the EmbeddingMatrix (vectors, chunk texts and metadata).
+    Every invalidation bumps a generation; a loader reads it before loading
+    and passes it to put(), which drops the result if an invalidation ran
+    in between, so a load that raced an update is never served as fresh.
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: float):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple, Tuple[EmbeddingMatrix, int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+        self._generation = 0
+
+    def generation(self) -> int:
+        """Read before loading and pass to put()"""
+        with self._lock:
+            return self._generation
+
+    @staticmethod
+    def _make_key(session_id: str, doc_ids: Iterable[str]) -> Tuple:
+        return (session_id, tuple(sorted(doc_ids)))
+
+    @staticmethod
+    def _estimate_size(embeddings: EmbeddingMatrix) -> int:
+        text_bytes = sum(len(chunk.get("text") or "")
+                         for chunk in embeddings.chunks)
+        return embeddings.nbytes + text_bytes + CHUNK_OVERHEAD_BYTES * len(embeddings)
+
+    def get(self, session_id: str, doc_ids: Iterable[str]) -> Optional[EmbeddingMatrix]:
+        key = self._make_key(session_id, doc_ids)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            embeddings, size, stored_at = entry
+            if time.time() - stored_at > self.ttl_seconds:
+                self._remove(key)
+                self.evictions += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return embeddings
+
+    def put(self, session_id: str, doc_ids: Iterable[str], embeddings: EmbeddingMatrix,
+            generation: int = None):
+        key = self._make_key(session_id, doc_ids)
+        size = self._estimate_size(embeddings)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                # Built from data an invalidation has since replaced
+                self.stale_puts += 1
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (embeddings, size, time.time())
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes and self._entries:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def _remove(self, key: Tuple):
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
+
+    def invalidate_session(self, session_id: str):
+        """Drop every entry belonging to a session"""
+        with self._lock:
+            self._generation += 1
+            for key in [k for k in self._entries if k[0] == session_id]:
+                self._remove(key)
+                self.invalidations += 1
+
+    def invalidate_document(self, doc_id: str):
+        """Drop every entry that was built from a document"""
+        with self._lock:
+            self._generation += 1
+            for key in [k for k in self._entries if doc_id in k[1]]:
+                self._remove(key)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "current_bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "stale_puts": self.stale_puts,
+            }
+
+
+class QueryEmbeddingCache:
+    """Byte-bounded LRU cache of query embeddings keyed by (model name, normalized text).
+
+    Normalization folds case, Unicode forms and whitespace only. The default
+    all-MiniLM-L6-v2 tokenizer is uncased, so those variants already encode
+    to the same vector and a hit never changes retrieval results.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[np.ndarray, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    normalize_text = staticmethod(normalize_text)
+
+    def get(self, model_name: str, text: str) -> Optional[np.ndarray]:
+        key = (model_name, self.normalize_text(text))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, model_name: str, text: str, vector: np.ndarray):
+        key = (model_name, self.normalize_text(text))
+        # Cached vectors are shared between callers, so keep them read-only
+        vector = np.array(vector, dtype=np.float32)
+        vector.setflags(write=False)
+        size = vector.nbytes + len(key[1]) + CHUNK_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (vector, size)
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes and self._entries:
+                _, (_, oldest_size) = self._entries.popitem(last=False)
+                self.current_bytes -= oldest_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "current_bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+class RerankScoreCache:
+    """Entry-bounded LRU + TTL cache of rerank scores.
+
+    Keys are (scorer id, normalized query, chunk content hash), so a score
+    is only reused for the same question, the same passage text and the
+    same scoring model. Follow-up questions in a session mostly rerank the
+    same candidates, and only the pairs missing here go to the scorer.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, str, str], Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_many(self, scorer_id: str, query: str, content_hashes: Iterable[str]) -> Dict[str, float]:
+        """Cached scores for the given chunk hashes; missing or expired ones are left out"""
+        query = normalize_text(query)
+        now = time.time()
+        found = {}
+        with self._lock:
+            for content_hash in content_hashes:
+                key = (scorer_id, query, content_hash)
+                entry = self._entries.get(key)
+                if entry is not None and now - entry[1] > self.ttl_seconds:
+                    del self._entries[key]
+                    self.evictions += 1
+                    entry = None
+                if entry is None:
+                    self.misses += 1
+                    continue
+                self._entries.move_to_end(key)
+                self.hits += 1
+                found[content_hash] = entry[0]
+        return found
+
+    def put_many(self, scorer_id: str, query: str, scores: Dict[str, float]):
+        query = normalize_text(query)
+        now = time.time()
+        with self._lock:
+            for content_hash, score in scores.items():
+                key = (scorer_id, query, content_hash)
+                self._entries.pop(key, None)
+                self._entries[key] = (float(score), now)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+# Shared by EmbeddingService and DocumentSessionManager
+embedding_cache = SessionEmbeddingCache(
+    max_bytes=int(float(os.getenv("EMBEDDING_CACHE_MAX_MB", "256")) * 1024 * 1024),
+    ttl_seconds=float(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", "900")),
+)
+
+# Repeated and re-asked questions (including voice retries) skip the encoder
+query_embedding_cache = QueryEmbeddingCache(
+    max_bytes=int(float(os.getenv("QUERY_EMBEDDING_CACHE_MAX_MB", "16")) * 1024 * 1024),
+)
+
+# Scores of (query, passage) pairs already ranked by the reranker
+rerank_score_cache = RerankScoreCache(
+    max_entries=int(os.getenv("RERANK_CACHE_MAX_ENTRIES", "20000")),
+    ttl_seconds=float(os.getenv("RERANK_CACHE_TTL_SECONDS", "1800")),
+)
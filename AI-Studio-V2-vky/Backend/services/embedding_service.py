@@ -1,5 +1,4 @@
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from sentence_transformers import SentenceTransformer
 import uuid
 import json
 import numpy as np
@@ -7,12 +6,38 @@ import openai
 import os
 import re
 import logging
-from utils.snowflake_setup import get_snowflake_config
-import snowflake.connector
-from typing import List, Dict, Tuple, Any
+from utils.snowflake_pool import snowflake_pool
+from utils.embedding_codec import encode_embedding, decode_embedding
+from utils.content_hash import chunk_content_hash
+from utils.schema_check import has_content_hash_columns
+from typing import List, Dict, Tuple, Any, Callable
 from services.reranker import RerankerService
 from utils.content_processor import ContentProcessor
 from services.session_manager import DocumentSessionManager
+from services.vector_search import top_k_indices, shortlist_indices, normalize_vector
+from services.bm25_index import bm25_indexes, reciprocal_rank_fusion
+from services.embedding_cache import embedding_cache, query_embedding_cache
+from services.retrieval_backends import create_retrieval_backend
+from services.vector_shards import vector_shards
+from services.chunk_writer import bulk_insert_chunks
+from services.async_db import async_db
+from services.inference_executor import query_inference, bulk_inference, db_executor
+from services.query_batcher import QueryEmbeddingBatcher
+from services.encoder_backends import get_sentence_encoder, check_stored_agreement, EMBEDDING_AGREEMENT_SAMPLE
+
+
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+# Candidates handed to the reranker: the cosine top-N (the recall/latency
+# knob, 0 = all), optionally trimmed where the scores drop off (none, gap or elbow)
+RERANK_SHORTLIST_SIZE = int(os.getenv("RERANK_SHORTLIST_SIZE", "50"))
+RERANK_SHORTLIST_CUT = os.getenv("RERANK_SHORTLIST_CUT", "none").lower()
+RERANK_SHORTLIST_GAP = float(os.getenv("RERANK_SHORTLIST_GAP", "0.08"))
+RERANK_SHORTLIST_MIN = int(os.getenv("RERANK_SHORTLIST_MIN", "10"))
+# Fuse BM25 hits into the dense shortlist with reciprocal-rank fusion so exact
+# identifiers, table labels and numbers are not lost to cosine similarity
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "true").lower() == "true"
+BM25_CANDIDATES = int(os.getenv("BM25_CANDIDATES", "50"))
+RRF_K = int(os.getenv("RRF_K", "60"))
 
 
 class EmbeddingService:
@@ -35,9 +60,16 @@ class EmbeddingService:
             length_function=len,
         )
         print("Loading embedding model...")
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-        snowflake_config = get_snowflake_config()
-        self.snowflake_conn = snowflake.connector.connect(**snowflake_config)
+        self.embedding_model_name = EMBEDDING_MODEL_NAME
+        # EMBEDDING_BACKEND selects torch, onnx, onnx_int8 or openvino
+        self.embedding_model = get_sentence_encoder(self.embedding_model_name)
+        if self.embedding_model.encoder_backend != "torch":
+            self._verify_encoder_agreement()
+
+        # Similarity search backend (RETRIEVAL_BACKEND: local, ann, snowflake_vector, sqlite)
+        self.retrieval_backend = create_retrieval_backend(
+            snowflake_pool.connection,
+            self.embedding_model.get_sentence_embedding_dimension())
 
         # Initialize reranker and content processor
         self.reranker = RerankerService()
@@ -45,6 +77,13 @@ class EmbeddingService:
         self.session_manager = DocumentSessionManager()
         self.logger = logging.getLogger(__name__)
 
+        # Chunks per forward pass when embedding documents
+        self.embedding_batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+
+        # Concurrent chat queries share batched forward passes
+        self.query_batcher = QueryEmbeddingBatcher(
+            self._encode_query_batch, query_inference)
+
         # Configuration for enhanced chunking
         self.SECTION_HEADERS = [
             "ABSTRACT", "INTRODUCTION", "METHODS", "METHOD",
@@ -55,26 +94,107 @@ class EmbeddingService:
         print("✅ Embedding service initialized")
         EmbeddingService._initialized = True
 
-    def get_snowflake_connection(self):
-        """Get a fresh Snowflake connection"""
-        snowflake_config = get_snowflake_config()
-        return snowflake.connector.connect(**snowflake_config)
+    def _verify_encoder_agreement(self):
+        """Fall back to PyTorch if the selected runtime disagrees with stored vectors"""
+        if os.getenv("EMBEDDING_AGREEMENT_CHECK", "true").lower() != "true":
+            return
+        try:
+            with snowflake_pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"""
+                    SELECT chunk_text, embedding_vector
+                    FROM document_chunks SAMPLE ({EMBEDDING_AGREEMENT_SAMPLE} ROWS)
+                    WHERE embedding_vector IS NOT NULL
+                """)
+                rows = cursor.fetchall()
+            stored = np.array([decode_embedding(embedding) for _, embedding in rows], dtype=np.float32)
+            report = check_stored_agreement(
+                self.embedding_model, [text for text, _ in rows], stored)
+        except Exception as e:
+            print(f"⚠️ Encoder agreement check skipped: {e}")
+            return
+
+        backend = self.embedding_model.encoder_backend
+        print(
+            f"📐 {backend} vs stored embeddings: mean cosine {report['mean_cosine']:.4f}, "
+            f"min {report['min_cosine']:.4f} over {report['samples']} chunks")
+        if not report["compatible"]:
+            print(f"⚠️ {backend} encoder is not compatible with stored embeddings, using torch")
+            self.embedding_model = get_sentence_encoder(self.embedding_model_name, "torch")
 
-    async def process_document(self, doc_id: str, text_content: str):
+    def get_snowflake_connection(self):
+        """Check out a pooled Snowflake connection; close() returns it to the pool"""
+        return snowflake_pool.acquire()
+
+    def _encode_query_batch(self, texts: List[str]) -> np.ndarray:
+        """Encode a micro-batch of queries into unit-length float32 rows"""
+        embeddings = self.embedding_model.encode(
+            texts,
+            batch_size=len(texts),
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        return np.asarray(embeddings, dtype=np.float32)
+
+    async def _embed_query(self, text: str) -> np.ndarray:
+        """Encode a query through the micro-batcher, off the event loop"""
+        cached = query_embedding_cache.get(self.embedding_model_name, text)
+        if cached is not None:
+            return cached
+        embedding = await self.query_batcher.embed(text)
+        query_embedding_cache.put(self.embedding_model_name, text, embedding)
+        return embedding
+
+    async def _search_backend(self, session_id: str, doc_ids: List[str], query_embedding):
+        """Run the retrieval backend (Snowflake fetches, matrix scoring) off the event loop"""
+        return await async_db.run(
+            self.retrieval_backend.search, session_id, doc_ids, query_embedding)
+
+    def _encode_chunks(self, texts: List[str], batch_size: int = None) -> np.ndarray:
+        """Encode document chunks in batches into unit-length float32 rows"""
+        if not texts:
+            return np.zeros((0, self.embedding_model.get_sentence_embedding_dimension()), dtype=np.float32)
+        embeddings = self.embedding_model.encode(
+            texts,
+            batch_size=batch_size or self.embedding_batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        return np.asarray(embeddings, dtype=np.float32)
+
+    async def process_document(self, doc_id: str, text_content: str, batch_size: int = None,
+                               progress_callback: Callable = None, source_doc_id: str = None,
+                               replace_chunk_ids: List[str] = None):
+        """Chunk, embed and store a document.
+
+        When source_doc_id names an already processed upload of the same file,
+        its chunks and vectors are copied instead of re-chunking and encoding.
+        When reprocessing, replace_chunk_ids lists the document's previous
+        chunks; they are deleted only once every new chunk is stored.
+        """
         print(f"Processing document {doc_id} for chunking and embedding...")
 
         # Fetch filename for metadata
-        cursor = self.snowflake_conn.cursor()
         filename = None
         try:
-            cursor.execute(
+            row = await async_db.fetchone(
                 "SELECT filename FROM documents WHERE doc_id = %s", (doc_id,))
-            row = cursor.fetchone()
             filename = row[0] if row else "unknown"
         except Exception as e:
             print(f"⚠️ Could not fetch filename for {doc_id}: {e}")
             filename = "unknown"
 
+        if source_doc_id:
+            source_rows = await db_executor.run(self._fetch_document_chunks, source_doc_id)
+            if source_rows:
+                print(
+                    f"♻️ Reusing {len(source_rows)} chunks from identical document {source_doc_id}")
+                return await self._copy_document_chunks(doc_id, filename, source_rows, progress_callback)
+            print(
+                f"⚠️ No stored chunks for {source_doc_id}, processing {doc_id} from scratch")
+
         # Split the incoming text into page blocks using the injected page headers
         # Header format inserted earlier: "--- PAGE X ---"
         page_blocks: List[Tuple[int, str]] = []
@@ -170,23 +290,20 @@ class EmbeddingService:
         print(
             f"Created {len(all_chunks)} chunks across {len(page_blocks)} page blocks")
 
-        # Generate embeddings and store
-        cursor = self.snowflake_conn.cursor()
-
-        for i, (chunk, meta) in enumerate(all_chunks):
-            chunk_id = str(uuid.uuid4())
-
-            # Generate embedding
-            embedding = self.embedding_model.encode(chunk)
+        if progress_callback:
+            progress_callback(
+                "embedding", f"Embedding {len(all_chunks)} chunks", 0.5)
 
-            # Store in Snowflake - convert embedding to a format Snowflake can handle
-            embedding_list = embedding.tolist()
-            # Convert to regular floats to avoid scientific notation and limit precision
-            embedding_list = [round(float(x), 6) for x in embedding_list]
+        # Reuse stored vectors for known chunks and encode only the rest
+        texts = [chunk for chunk, _ in all_chunks]
+        content_hashes = [chunk_content_hash(text, self.embedding_model_name) for text in texts]
+        embeddings, reused = await self._embed_chunks_deduplicated(
+            texts, content_hashes, batch_size)
 
-            # Store as JSON string in TEXT column
-            embedding_json = json.dumps(embedding_list)
+        # Build chunk rows
+        pending_rows = []
 
+        for i, (chunk, meta) in enumerate(all_chunks):
             # Create enhanced metadata for the chunk
             content_type = meta.get(
                 "content_type") or self.content_processor.classify_content_type(chunk)
@@ -200,36 +317,227 @@ class EmbeddingService:
             metadata["filename"] = meta.get("filename")
             metadata["page"] = meta.get("page")
             metadata["paragraph_start"] = meta.get("paragraph_start")
-            metadata_json = json.dumps(metadata)
 
-            try:
-                cursor.execute("""
-                    INSERT INTO document_chunks 
-                    (chunk_id, doc_id, chunk_text, chunk_index, embedding_vector, metadata)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                """, (chunk_id, doc_id, chunk, i, embedding_json, metadata_json))
-                print(f"Processed chunk {i+1}/{len(all_chunks)}")
-                self.logger.info(f"Stored chunk idx={i}")
-            except Exception as e:
-                print(f"Error inserting chunk {i}: {e}")
-                # Continue with next chunk instead of failing completely
-                continue
+            pending_rows.append({
+                "chunk_id": str(uuid.uuid4()),
+                "chunk_index": i,
+                "text": chunk,
+                "filename": filename,
+                "metadata": metadata,
+                "embedding": embeddings[i],
+                "content_hash": content_hashes[i],
+            })
+
+        result = await self._store_chunks(
+            doc_id, pending_rows, progress_callback, replace_chunk_ids=replace_chunk_ids)
+        result["chunks_reused"] = reused
+        return result
+
+    async def _embed_chunks_deduplicated(self, texts: List[str], content_hashes: List[str],
+                                         batch_size: int = None) -> Tuple[List[np.ndarray], int]:
+        """Look up stored vectors by content hash and encode only unseen chunks.
+
+        Returns (one embedding per text, number of chunks that skipped the encoder).
+        """
+        known = await db_executor.run(
+            self._fetch_embeddings_by_hash, sorted(set(content_hashes)))
+
+        # Identical chunks within the document are encoded once as well
+        missing: Dict[str, str] = {}
+        for text, content_hash in zip(texts, content_hashes):
+            if content_hash not in known and content_hash not in missing:
+                missing[content_hash] = text
+
+        if missing:
+            # Generate new embeddings in batched forward passes on the bulk lane
+            encoded = await bulk_inference.run(
+                self._encode_chunks, list(missing.values()), batch_size=batch_size)
+            known.update(zip(missing.keys(), encoded))
+
+        reused = len(texts) - len(missing)
+        if reused:
+            print(f"♻️ Reused {reused}/{len(texts)} chunk embeddings by content hash")
+        return [known[content_hash] for content_hash in content_hashes], reused
+
+    async def _copy_document_chunks(self, doc_id: str, filename: str, source_rows: List[Tuple],
+                                    progress_callback: Callable = None) -> Dict:
+        """Store another document's chunks and vectors under doc_id without re-encoding"""
+        pending_rows = []
+        for chunk_text, chunk_index, embedding_text, metadata_json, content_hash in source_rows:
+            metadata = json.loads(metadata_json) if metadata_json else {}
+            metadata["filename"] = filename
+            metadata["source_file"] = filename
+            pending_rows.append({
+                "chunk_id": str(uuid.uuid4()),
+                "chunk_index": chunk_index,
+                "text": chunk_text,
+                "filename": filename,
+                "metadata": metadata,
+                "embedding": decode_embedding(embedding_text),
+                "content_hash": content_hash or chunk_content_hash(chunk_text, self.embedding_model_name),
+            })
 
-        self.snowflake_conn.commit()
+        result = await self._store_chunks(doc_id, pending_rows, progress_callback)
+        result["chunks_reused"] = len(pending_rows)
+        return result
+
+    async def _store_chunks(self, doc_id: str, pending_rows: List[Dict[str, Any]],
+                            progress_callback: Callable = None, replace_chunk_ids: List[str] = None) -> Dict:
+        """Insert chunk rows, write the vector shard, index them and set the document status"""
+        chunk_rows = [
+            (row["chunk_id"], doc_id, row["text"], row["chunk_index"],
+             # Store as packed base64 text (see utils/embedding_codec.py)
+             encode_embedding(row["embedding"]),
+             json.dumps(row["metadata"]), row["content_hash"])
+            for row in pending_rows
+        ]
+
+        if progress_callback:
+            progress_callback(
+                "embedding", f"Storing {len(chunk_rows)} chunks", 0.8)
+
+        # Store all chunks in multi-row batches
+        insert_report = await db_executor.run(
+            self._insert_chunk_rows, chunk_rows)
+        indexed_rows = [pending_rows[pos]
+                        for pos in insert_report["inserted_positions"]]
+        self.logger.info(
+            f"Stored {insert_report['inserted']}/{len(chunk_rows)} chunks for {doc_id}")
+        if insert_report["failed_batches"]:
+            print(
+                f"⚠️ {insert_report['failed']} chunks failed to insert in {len(insert_report['failed_batches'])} batches")
 
-        # Update document status
-        cursor.execute(
-            "UPDATE documents SET status = 'processed' WHERE doc_id = %s", (doc_id,))
-        self.snowflake_conn.commit()
+        # Reprocessing swaps chunk sets only when the new one is complete
+        if replace_chunk_ids is not None:
+            if insert_report["failed_batches"]:
+                return await self._keep_previous_chunks(doc_id, indexed_rows, insert_report)
+            if replace_chunk_ids:
+                await db_executor.run(self._delete_chunk_ids, replace_chunk_ids)
+                print(f"🗑️ Replaced {len(replace_chunk_ids)} previous chunks of {doc_id}")
 
-        print(f"✅ Document {doc_id} processing complete")
+        indexed_chunks = [{"text": row["text"], "metadata": row["metadata"], "filename": row["filename"]}
+                          for row in indexed_rows]
+
+        # Persist a local memory-mappable shard for retrieval and warm restarts
+        # (disk writes and fsync, off the event loop)
+        try:
+            await db_executor.run(
+                vector_shards.write,
+                doc_id,
+                [row["embedding"] for row in indexed_rows],
+                indexed_chunks,
+                chunk_ids=[row["chunk_id"] for row in indexed_rows])
+        except Exception as e:
+            print(f"⚠️ Could not write vector shard for {doc_id}: {e}")
+
+        # Lexical index for hybrid retrieval (CPU-bound, on the bulk lane)
+        try:
+            await bulk_inference.run(bm25_indexes.build, doc_id, indexed_chunks)
+        except Exception as e:
+            print(f"⚠️ Could not build BM25 index for {doc_id}: {e}")
 
+        # Let server-side retrieval backends index the new vectors
+        # (a Snowflake UPDATE for snowflake_vector)
+        try:
+            await db_executor.run(self.retrieval_backend.index_document, doc_id, indexed_rows)
+        except Exception as e:
+            print(
+                f"⚠️ {self.retrieval_backend.name} backend failed to index {doc_id}: {e}")
+
+        # Update document status; a document with no stored chunks is marked failed
+        status = "processed" if indexed_rows or not chunk_rows else "failed"
+        await async_db.execute(
+            "UPDATE documents SET status = %s WHERE doc_id = %s", (status, doc_id))
+
+        # Any cached session matrix built before this document finished is stale
+        embedding_cache.invalidate_document(doc_id)
+
+        print(f"✅ Document {doc_id} processing complete ({status})")
+
+        return {
+            "doc_id": doc_id,
+            "chunks_created": insert_report["inserted"],
+            "chunks_failed": insert_report["failed"],
+            "failed_batches": insert_report["failed_batches"],
+            "status": status
+        }
+
+    async def _keep_previous_chunks(self, doc_id: str, stored_rows: List[Dict[str, Any]],
+                                    insert_report: Dict[str, Any]) -> Dict:
+        """Undo a partial reprocess: drop the new chunks and leave the previous ones serving"""
+        await db_executor.run(self._delete_chunk_ids, [row["chunk_id"] for row in stored_rows])
+
+        # Indexes and shards are rebuilt from the previous chunks on next use
+        bm25_indexes.delete(doc_id)
+        try:
+            await db_executor.run(vector_shards.delete, doc_id)
+            await db_executor.run(self.retrieval_backend.remove_documents, [doc_id])
+        except Exception as e:
+            print(f"⚠️ {self.retrieval_backend.name} backend failed to drop {doc_id}: {e}")
+        embedding_cache.invalidate_document(doc_id)
+
+        print(f"⚠️ Reprocessing {doc_id} stored {len(stored_rows)} of "
+              f"{insert_report['inserted'] + insert_report['failed']} chunks; kept the previous chunks")
         return {
             "doc_id": doc_id,
-            "chunks_created": len(all_chunks),
-            "status": "processed"
+            "chunks_created": 0,
+            "chunks_failed": insert_report["failed"],
+            "failed_batches": insert_report["failed_batches"],
+            "status": "failed"
         }
 
+    def _delete_chunk_ids(self, chunk_ids: List[str]):
+        if not chunk_ids:
+            return
+        with snowflake_pool.connection() as conn:
+            cursor = conn.cursor()
+            # Keep each IN list within Snowflake's expression limits
+            for start in range(0, len(chunk_ids), 1000):
+                batch = chunk_ids[start:start + 1000]
+                placeholders = ','.join(['%s'] * len(batch))
+                cursor.execute(f"DELETE FROM document_chunks WHERE chunk_id IN ({placeholders})", batch)
+            conn.commit()
+
+    def _insert_chunk_rows(self, chunk_rows: List[Tuple]) -> Dict[str, Any]:
+        with snowflake_pool.connection() as conn:
+            return bulk_insert_chunks(conn, chunk_rows)
+
+    def _fetch_embeddings_by_hash(self, content_hashes: List[str]) -> Dict[str, np.ndarray]:
+        """Stored vectors for any of the given chunk content hashes"""
+        found: Dict[str, np.ndarray] = {}
+        if not content_hashes or not has_content_hash_columns():
+            return found
+        try:
+            with snowflake_pool.connection() as conn:
+                cursor = conn.cursor()
+                # Keep each IN list within Snowflake's expression limits
+                for start in range(0, len(content_hashes), 1000):
+                    batch = content_hashes[start:start + 1000]
+                    placeholders = ','.join(['%s'] * len(batch))
+                    cursor.execute(f"""
+                        SELECT content_hash, ANY_VALUE(embedding_vector)
+                        FROM document_chunks
+                        WHERE content_hash IN ({placeholders})
+                        AND embedding_vector IS NOT NULL
+                        GROUP BY content_hash
+                    """, batch)
+                    for content_hash, embedding_text in cursor.fetchall():
+                        found[content_hash] = decode_embedding(embedding_text)
+        except Exception as e:
+            print(f"⚠️ Embedding lookup by content hash failed, encoding all chunks: {e}")
+        return found
+
+    def _fetch_document_chunks(self, doc_id: str) -> List[Tuple]:
+        with snowflake_pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT chunk_text, chunk_index, embedding_vector, metadata, content_hash
+                FROM document_chunks
+                WHERE doc_id = %s AND embedding_vector IS NOT NULL
+                ORDER BY chunk_index
+            """, (doc_id,))
+            return cursor.fetchall()
+
     async def find_relevant_chunks(self, question: str, top_k: int = 5, session_id: str = None):
         """Enhanced retrieval with reranking and content-type awareness - SESSION SCOPED"""
         print(f"Searching for relevant chunks for: {question}")
@@ -253,61 +561,19 @@ class EmbeddingService:
             f"🔍 Searching in session {session_id} with {len(session_doc_ids)} documents")
 
         # Generate question embedding
-        question_embedding = self.embedding_model.encode(question)
-        question_embedding_list = question_embedding.tolist()
-        question_embedding_list = [round(float(x), 6)
-                                   for x in question_embedding_list]
-
-        cursor = self.snowflake_conn.cursor()
+        question_embedding = await self._embed_query(question)
 
         try:
-            # Get chunks only from the current session's documents
-            placeholders = ','.join(['%s'] * len(session_doc_ids))
-            cursor.execute(f"""
-                SELECT 
-                    dc.chunk_text,
-                    d.filename,
-                    dc.embedding_vector,
-                    dc.metadata
-                FROM document_chunks dc
-                JOIN documents d ON dc.doc_id = d.doc_id
-                WHERE d.doc_id IN ({placeholders})
-                AND d.status = 'processed'
-            """, session_doc_ids)
-
-            chunks_with_similarity = []
-            for chunk_text, filename, embedding_json, metadata_json in cursor.fetchall():
-                try:
-                    # Parse the stored embedding and metadata
-                    stored_embedding = json.loads(embedding_json)
-                    metadata = json.loads(
-                        metadata_json) if metadata_json else {}
-
-                    # Compute cosine similarity
-                    similarity = self._cosine_similarity(
-                        question_embedding_list, stored_embedding)
-
-                    # Create chunk object with metadata
-                    chunk_obj = {
-                        "text": chunk_text,
-                        "metadata": metadata,
-                        "filename": filename,
-                    }
-
-                    chunks_with_similarity.append(
-                        (chunk_obj, filename, similarity))
-                except Exception as e:
-                    print(f"Error processing chunk similarity: {e}")
-                    continue
-
-            # Apply reranking
-            reranked_chunks = await self._rerank_chunks(question, chunks_with_similarity, top_k)
-
+            # Score the session's chunks with the configured backend
+            candidates, similarities = await self._search_backend(
+                session_id, session_doc_ids, question_embedding)
         except Exception as e:
-            print(f"Error in similarity search: {e}")
+            # Only a failed backend search falls back; shortlist and rerank
+            # errors propagate instead of hiding behind the plain text query
+            self.logger.exception(f"❌ Similarity search failed, using plain text fallback: {e}")
             # Fallback to simple text search within session
             placeholders = ','.join(['%s'] * len(session_doc_ids))
-            cursor.execute(f"""
+            rows = await async_db.fetchall(f"""
                 SELECT 
                     dc.chunk_text,
                     d.filename
@@ -320,14 +586,106 @@ class EmbeddingService:
 
             # Build a minimal structure compatible with downstream usage
             reranked_chunks = []
-            for chunk_text, filename in cursor.fetchall():
+            for chunk_text, filename in rows:
                 reranked_chunks.append({
                     "text": chunk_text,
                     "filename": filename,
                     "metadata": {},
                     "score": 0.5,
                 })
+            return self._build_context(session_id, reranked_chunks)
+
+        chunks_with_similarity = await self._hybrid_shortlist(
+            question, session_doc_ids, candidates, similarities, top_k, question_embedding)
+
+        # Apply reranking
+        reranked_chunks = await self._rerank_chunks(question, chunks_with_similarity, top_k)
+
+        return self._build_context(session_id, reranked_chunks)
+
+    def _shortlist_for_rerank(self, candidates: List[Dict], similarities, top_k: int) -> List[Tuple]:
+        """Cosine shortlist of (chunk, filename, similarity), best first, for the reranker"""
+        similarities = np.asarray(similarities, dtype=np.float32)
+        size = max(RERANK_SHORTLIST_SIZE, top_k) if RERANK_SHORTLIST_SIZE > 0 else len(candidates)
+        indices = shortlist_indices(
+            similarities, size,
+            min_keep=max(top_k, RERANK_SHORTLIST_MIN),
+            cut=RERANK_SHORTLIST_CUT, gap=RERANK_SHORTLIST_GAP)
+        print(f"✂️ Reranking {len(indices)} of {len(candidates)} candidates")
+        return [(candidates[i], candidates[i]["filename"], float(similarities[i]))
+                for i in indices.tolist()]
+
+    async def _hybrid_shortlist(self, question: str, doc_ids: List[str], candidates: List[Dict],
+                                similarities, top_k: int, query_embedding) -> List[Tuple]:
+        """Dense shortlist fused with BM25 hits by reciprocal rank, capped at the shortlist size.
+
+        Every entry carries its real cosine similarity, which the reranker's
+        fallbacks rank by: BM25 hits outside the backend's candidates are
+        encoded to get theirs.
+        """
+        dense = self._shortlist_for_rerank(candidates, similarities, top_k)
+        if not HYBRID_RETRIEVAL:
+            return dense
 
+        try:
+            lexical, _ = await db_executor.run(
+                bm25_indexes.search, doc_ids, question, BM25_CANDIDATES, self._load_bm25_chunks)
+        except Exception as e:
+            self.logger.exception(f"⚠️ BM25 search failed, using the dense shortlist only: {e}")
+            return dense
+        if not lexical:
+            return dense
+
+        def key(chunk):
+            return chunk["filename"], chunk["text"]
+
+        # Cosine scores of every chunk the backend scored (all of them for
+        # the local backend, only its top-K for ann and snowflake_vector)
+        cosine = {key(chunk): float(score) for chunk, score in zip(candidates, np.asarray(similarities).tolist())}
+        by_key = {key(chunk): chunk for chunk in lexical}
+        by_key.update({key(chunk): chunk for chunk, _, _ in dense})
+
+        fused = reciprocal_rank_fusion(
+            [[key(chunk) for chunk, _, _ in dense], [key(chunk) for chunk in lexical]], k=RRF_K)
+        size = max(len(dense), top_k)
+        selected = [k for k, _ in fused[:size]]
+        unscored = [k for k in selected if k not in cosine]
+        if unscored:
+            try:
+                vectors = await query_inference.run(
+                    self._encode_chunks, [by_key[k]["text"] for k in unscored])
+                scores = vectors @ normalize_vector(query_embedding)
+                cosine.update(zip(unscored, scores.tolist()))
+            except Exception as e:
+                # Without a real cosine they would sink in the reranker's fallbacks
+                self.logger.exception(f"⚠️ Could not score BM25-only hits, leaving them out: {e}")
+                selected = [k for k in selected if k in cosine]
+
+        print(f"🔀 Fused {len(dense)} dense and {len(lexical)} BM25 candidates "
+              f"({len(unscored)} BM25-only) into {len(selected)}")
+        return [(by_key[k], by_key[k]["filename"], cosine[k]) for k in selected]
+
+    def _load_bm25_chunks(self, doc_id: str) -> List[Dict[str, Any]]:
+        """Chunks of a document for a cold BM25 build: local shard first, then Snowflake"""
+        shard = vector_shards.load(doc_id)
+        if shard is not None:
+            return shard[1]
+        with snowflake_pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT dc.chunk_text, d.filename, dc.metadata
+                FROM document_chunks dc
+                JOIN documents d ON dc.doc_id = d.doc_id
+                WHERE d.doc_id = %s AND d.status = 'processed'
+                ORDER BY dc.chunk_index
+            """, (doc_id,))
+            rows = cursor.fetchall()
+        return [{"text": chunk_text, "filename": filename,
+                 "metadata": json.loads(metadata_json) if metadata_json else {}}
+                for chunk_text, filename, metadata_json in rows]
+
+    def _build_context(self, session_id: str, reranked_chunks: List) -> Dict:
+        """Format reranked chunks into prompt context and source labels"""
         if not reranked_chunks:
             print(f"❌ No relevant documents found in session {session_id}")
             return None
@@ -406,7 +764,7 @@ class EmbeddingService:
             return reranked_chunks
 
         except Exception as e:
-            print(f"⚠️ Reranking failed, falling back to base similarity: {e}")
+            self.logger.exception(f"⚠️ Reranking failed, falling back to base similarity: {e}")
             # Fallback: sort by base similarity and return top_k
             chunks_with_similarity.sort(key=lambda x: x[2], reverse=True)
             fallback = []
@@ -419,26 +777,6 @@ class EmbeddingService:
                 })
             return fallback
 
-    def _cosine_similarity(self, vec1, vec2):
-        """Compute cosine similarity between two vectors"""
-        try:
-            vec1 = np.array(vec1)
-            vec2 = np.array(vec2)
-
-            # Normalize vectors
-            norm1 = np.linalg.norm(vec1)
-            norm2 = np.linalg.norm(vec2)
-
-            if norm1 == 0 or norm2 == 0:
-                return 0.0
-
-            # Compute cosine similarity
-            similarity = np.dot(vec1, vec2) / (norm1 * norm2)
-            return float(similarity)
-        except Exception as e:
-            print(f"Error computing similarity: {e}")
-            return 0.0
-
     async def check_query_relevance(self, query: str, session_id: str = None) -> Dict:
         """Check if query is relevant to uploaded documents in current session"""
         try:
@@ -471,86 +809,131 @@ class EmbeddingService:
                 f"🔍 Checking relevance for session {session_id} with {len(session_docs)} documents")
 
             # Generate query embedding
-            query_embedding = self.embedding_model.encode(query)
-            query_embedding_list = [round(float(x), 6)
-                                    for x in query_embedding.tolist()]
+            query_embedding = await self._embed_query(query)
 
-            cursor = self.snowflake_conn.cursor()
+            # Score chunks from this session's documents only
+            candidates, similarities = await self._search_backend(
+                session_id, session_docs, query_embedding)
 
-            # Get chunks from this session's documents only
-            placeholders = ','.join(['%s'] * len(session_docs))
-            cursor.execute(f"""
-                SELECT 
-                    dc.chunk_text,
-                    d.filename,
-                    dc.embedding_vector
-                FROM document_chunks dc
-                JOIN documents d ON dc.doc_id = d.doc_id
-                WHERE d.doc_id IN ({placeholders})
-                AND d.status = 'processed'
-            """, session_docs)
+            return self._score_relevance(session_id, session_docs, candidates, similarities)
+
+        except Exception as e:
+            print(f"❌ Error checking query relevance: {e}")
+            return {
+                "is_relevant": False,
+                "relevance_score": 0.0,
+                "matched_documents": [],
+                "scope_message": f"Error: {str(e)}",
+                "reason": "exception"
+            }
 
-            chunks = cursor.fetchall()
+    def _score_relevance(self, session_id: str, session_docs: List[str], candidates: List[Dict], similarities) -> Dict:
+        """Apply the out-of-scope rule (average of the top 3 similarities > 0.3)"""
+        if len(candidates) == 0:
+            return {
+                "is_relevant": False,
+                "relevance_score": 0.0,
+                "matched_documents": [],
+                "scope_message": f"No processed chunks in session {session_id}",
+                "reason": "no_processed_chunks"
+            }
 
-            if not chunks:
+        # Top matches via argpartition instead of sorting every chunk
+        top_matches = []
+        for idx in top_k_indices(similarities, 3):
+            chunk = candidates[idx]
+            chunk_text = chunk["text"]
+            top_matches.append({
+                "filename": chunk["filename"],
+                "similarity": float(similarities[idx]),
+                "chunk_preview": chunk_text[:100] + "..." if len(chunk_text) > 100 else chunk_text
+            })
+        avg_relevance = sum(r["similarity"]
+                            for r in top_matches) / len(top_matches)
+
+        # Determine if query is relevant
+        is_relevant = avg_relevance > 0.3  # Threshold for relevance
+
+        return {
+            "is_relevant": is_relevant,
+            "relevance_score": avg_relevance,
+            "matched_documents": top_matches,
+            "scope_message": f"Query relevance: {avg_relevance:.2f} in session {session_id}",
+            "reason": "relevance_calculated",
+            "session_id": session_id,
+            "total_documents": len(session_docs)
+        }
+
+    async def search_session(self, question: str, top_k: int = 5, session_id: str = None) -> Dict:
+        """Relevance gate and ranked retrieval from one query embedding and one scoring pass.
+
+        Returns {"relevance": <check_query_relevance result>, "relevant_docs":
+        <find_relevant_chunks result or None>}. Retrieval is skipped when the
+        query is out of scope.
+        """
+        print(f"Searching for relevant chunks for: {question}")
+        try:
+            # Get current session if none provided
+            if session_id is None:
+                session_id = self.session_manager.get_current_session_id()
+
+            if not session_id:
                 return {
-                    "is_relevant": False,
-                    "relevance_score": 0.0,
-                    "matched_documents": [],
-                    "scope_message": f"No processed chunks in session {session_id}",
-                    "reason": "no_processed_chunks"
+                    "relevance": {
+                        "is_relevant": False,
+                        "relevance_score": 0.0,
+                        "matched_documents": [],
+                        "scope_message": "No active session",
+                        "reason": "no_session"
+                    },
+                    "relevant_docs": None
                 }
 
-            # Calculate relevance scores
-            relevance_scores = []
-            for chunk_text, filename, embedding_json in chunks:
-                try:
-                    stored_embedding = json.loads(embedding_json)
-                    similarity = self._cosine_similarity(
-                        query_embedding_list, stored_embedding)
-                    relevance_scores.append({
-                        "filename": filename,
-                        "similarity": similarity,
-                        "chunk_preview": chunk_text[:100] + "..." if len(chunk_text) > 100 else chunk_text
-                    })
-                except Exception as e:
-                    print(f"Error processing chunk relevance: {e}")
-                    continue
-
-            if not relevance_scores:
+            session_docs = self.session_manager.get_documents_for_session(
+                session_id)
+            if not session_docs:
                 return {
-                    "is_relevant": False,
-                    "relevance_score": 0.0,
-                    "matched_documents": [],
-                    "scope_message": f"Error processing chunks in session {session_id}",
-                    "reason": "processing_error"
+                    "relevance": {
+                        "is_relevant": False,
+                        "relevance_score": 0.0,
+                        "matched_documents": [],
+                        "scope_message": f"No documents in session {session_id}",
+                        "reason": "no_documents_in_session"
+                    },
+                    "relevant_docs": None
                 }
 
-            # Sort by relevance and get top matches
-            relevance_scores.sort(key=lambda x: x["similarity"], reverse=True)
-            top_matches = relevance_scores[:3]
-            avg_relevance = sum(r["similarity"]
-                                for r in top_matches) / len(top_matches)
+            print(
+                f"🔍 Searching in session {session_id} with {len(session_docs)} documents")
 
-            # Determine if query is relevant
-            is_relevant = avg_relevance > 0.3  # Threshold for relevance
+            query_embedding = await self._embed_query(question)
+            candidates, similarities = await self._search_backend(
+                session_id, session_docs, query_embedding)
+
+            relevance = self._score_relevance(
+                session_id, session_docs, candidates, similarities)
+            if not relevance["is_relevant"]:
+                return {"relevance": relevance, "relevant_docs": None}
+
+            # Reuse the same scores for ranking instead of re-encoding
+            chunks_with_similarity = await self._hybrid_shortlist(
+                question, session_docs, candidates, similarities, top_k, query_embedding)
+            reranked_chunks = await self._rerank_chunks(question, chunks_with_similarity, top_k)
 
             return {
-                "is_relevant": is_relevant,
-                "relevance_score": avg_relevance,
-                "matched_documents": top_matches,
-                "scope_message": f"Query relevance: {avg_relevance:.2f} in session {session_id}",
-                "reason": "relevance_calculated",
-                "session_id": session_id,
-                "total_documents": len(session_docs)
+                "relevance": relevance,
+                "relevant_docs": self._build_context(session_id, reranked_chunks)
             }
 
         except Exception as e:
-            print(f"❌ Error checking query relevance: {e}")
+            self.logger.exception(f"❌ Error searching session: {e}")
             return {
-                "is_relevant": False,
-                "relevance_score": 0.0,
-                "matched_documents": [],
-                "scope_message": f"Error: {str(e)}",
-                "reason": "exception"
+                "relevance": {
+                    "is_relevant": False,
+                    "relevance_score": 0.0,
+                    "matched_documents": [],
+                    "scope_message": f"Error: {str(e)}",
+                    "reason": "exception"
+                },
+                "relevant_docs": None
             }
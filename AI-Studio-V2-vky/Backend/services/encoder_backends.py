@@ -0,0 +1,181 @@
+import os
+import inspect
+import threading
+import numpy as np
+from typing import Dict, List, Tuple
+
+from services.inference_executor import configure_torch_threads
+from utils.startup_timing import startup_timer
+
+# torch (default), onnx, onnx_int8 or openvino
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+# Dynamically quantized export shipped in the all-MiniLM-L6-v2 hub repo;
+# pick the variant matching the CPU (avx2, avx512, avx512_vnni, arm64)
+ONNX_INT8_FILE = os.getenv("ONNX_INT8_FILE", "onnx/model_qint8_avx2.onnx")
+# Minimum cosine between new and stored embeddings of the same chunk
+EMBEDDING_AGREEMENT_MIN = float(os.getenv("EMBEDDING_AGREEMENT_MIN", "0.98"))
+EMBEDDING_AGREEMENT_SAMPLE = int(os.getenv("EMBEDDING_AGREEMENT_SAMPLE", "64"))
+
+ENCODER_BACKENDS = ("torch", "onnx", "onnx_int8", "openvino")
+CROSS_ENCODER_BACKENDS = ("torch", "onnx", "openvino")
+
+# One loaded encoder per (model, backend) per process. Loading it in the
+# master before gunicorn forks lets workers share the weights copy-on-write.
+_encoders: Dict[Tuple[str, str], object] = {}
+_cross_encoders: Dict[Tuple[str, str], object] = {}
+_encoders_lock = threading.Lock()
+_huggingface_logged_in = False
+
+
+def huggingface_login():
+    """Log in to the Hugging Face hub once per process, just before the first model load.
+
+    Called with _encoders_lock held; under gunicorn preload this happens in
+    the master from main.preload_models.
+    """
+    global _huggingface_logged_in
+    if _huggingface_logged_in:
+        return
+    _huggingface_logged_in = True
+    hf_token = os.getenv("HF_TOKEN")
+    if not hf_token:
+        print("⚠️ HF_TOKEN not set")
+        return
+    from huggingface_hub import login
+    with startup_timer.phase("huggingface login"):
+        login(token=hf_token)
+    print("✅ Hugging Face token loaded")
+
+
+def get_sentence_encoder(model_name: str, backend: str = None):
+    """Return the process-wide encoder, loading it on first use"""
+    key = (model_name, (backend or EMBEDDING_BACKEND).lower())
+    if key not in _encoders:
+        with _encoders_lock:
+            if key not in _encoders:
+                huggingface_login()
+                configure_torch_threads()
+                with startup_timer.phase(f"load encoder {model_name} ({key[1]})"):
+                    _encoders[key] = load_sentence_encoder(*key)
+    return _encoders[key]
+
+
+def load_sentence_encoder(model_name: str, backend: str = None):
+    """Load the encoder on the requested runtime, falling back to PyTorch.
+
+    The ONNX and OpenVINO paths use the sentence-transformers backend
+    support (>= 3.2, with optimum[onnxruntime] / optimum[openvino]).
+    """
+    # Imported here so importing the service modules does not pull in torch
+    from sentence_transformers import SentenceTransformer
+
+    backend = (backend or EMBEDDING_BACKEND).lower()
+    if backend not in ENCODER_BACKENDS:
+        print(f"⚠️ Unknown EMBEDDING_BACKEND '{backend}', using torch")
+        backend = "torch"
+
+    if backend == "torch":
+        model = SentenceTransformer(model_name)
+    else:
+        try:
+            if backend == "onnx_int8":
+                model = SentenceTransformer(
+                    model_name, backend="onnx", model_kwargs={"file_name": ONNX_INT8_FILE})
+            else:
+                model = SentenceTransformer(model_name, backend=backend)
+        except Exception as e:
+            print(f"⚠️ Could not load {backend} encoder ({e}), using torch")
+            backend = "torch"
+            model = SentenceTransformer(model_name)
+
+    model.encoder_backend = backend
+    print(f"✅ Loaded {model_name} on the {backend} backend")
+    return model
+
+
+def get_cross_encoder(model_name: str, backend: str = "torch"):
+    """Return the process-wide cross-encoder, loading it on first use"""
+    key = (model_name, backend.lower())
+    if key not in _cross_encoders:
+        with _encoders_lock:
+            if key not in _cross_encoders:
+                huggingface_login()
+                configure_torch_threads()
+                with startup_timer.phase(f"load cross-encoder {model_name} ({key[1]})"):
+                    _cross_encoders[key] = load_cross_encoder(*key)
+    return _cross_encoders[key]
+
+
+def load_cross_encoder(model_name: str, backend: str = "torch"):
+    """Load a sentence-transformers CrossEncoder, falling back to PyTorch.
+
+    ONNX and OpenVINO need sentence-transformers >= 4.1.
+    """
+    from sentence_transformers import CrossEncoder
+
+    backend = backend.lower()
+    if backend not in CROSS_ENCODER_BACKENDS:
+        print(f"⚠️ Unknown cross-encoder backend '{backend}', using torch")
+        backend = "torch"
+
+    if backend == "torch":
+        model = CrossEncoder(model_name)
+    else:
+        try:
+            model = CrossEncoder(model_name, backend=backend)
+        except Exception as e:
+            print(f"⚠️ Could not load {backend} cross-encoder ({e}), using torch")
+            backend = "torch"
+            model = CrossEncoder(model_name)
+
+    model.encoder_backend = backend
+    print(f"✅ Loaded cross-encoder {model_name} on the {backend} backend")
+    return model
+
+
+def cross_encoder_scores(model, pairs: List[Tuple[str, str]], batch_size: int = 64) -> np.ndarray:
+    """Relevance of each (query, passage) pair in 0..1, scored in one batched pass.
+
+    ms-marco models emit logits and sentence-transformers versions disagree
+    on whether predict() applies a sigmoid, so the raw logits are requested
+    and squashed here.
+    """
+    import torch
+
+    # The keyword was renamed from activation_fct to activation_fn in 4.0
+    params = inspect.signature(model.predict).parameters
+    activation = "activation_fn" if "activation_fn" in params else "activation_fct"
+    logits = model.predict(pairs, batch_size=batch_size, show_progress_bar=False,
+                           convert_to_numpy=True, **{activation: torch.nn.Identity()})
+    logits = np.asarray(logits, dtype=np.float32).reshape(len(pairs))
+    return 1.0 / (1.0 + np.exp(-logits))
+
+
+def cosine_agreement(candidate: np.ndarray, reference: np.ndarray) -> Dict:
+    """Row-wise cosine between two embedding matrices of the same texts"""
+    candidate = np.asarray(candidate, dtype=np.float32)
+    reference = np.asarray(reference, dtype=np.float32)
+    candidate = candidate / np.maximum(np.linalg.norm(candidate, axis=1, keepdims=True), 1e-12)
+    reference = reference / np.maximum(np.linalg.norm(reference, axis=1, keepdims=True), 1e-12)
+    cosines = np.sum(candidate * reference, axis=1)
+    return {
+        "samples": int(len(cosines)),
+        "mean_cosine": float(cosines.mean()) if len(cosines) else 1.0,
+        "min_cosine": float(cosines.min()) if len(cosines) else 1.0,
+    }
+
+
+def check_stored_agreement(model, texts: List[str], stored: np.ndarray,
+                           threshold: float = EMBEDDING_AGREEMENT_MIN) -> Dict:
+    """Encode stored chunks with `model` and compare against their stored vectors.
+
+    Vectors already in document_chunks came from the PyTorch encoder, so a
+    new backend is only compatible if it reproduces them closely.
+    """
+    if not texts:
+        return {"samples": 0, "mean_cosine": 1.0, "min_cosine": 1.0, "compatible": True}
+    encoded = model.encode(texts, normalize_embeddings=True,
+                           convert_to_numpy=True, show_progress_bar=False)
+    report = cosine_agreement(encoded, stored)
+    report["compatible"] = report["min_cosine"] >= threshold
+    return report
@@ -6,15 +6,19 @@ import PyPDF2
 import fitz  # PyMuPDF for enhanced PDF processing
 from docx import Document
 import io
-from utils.snowflake_setup import get_snowflake_config
-import snowflake.connector
 from utils.content_processor import ContentProcessor
 from services.session_manager import DocumentSessionManager
+from utils.content_hash import file_content_hash
+from utils.schema_check import has_content_hash_columns
+from utils.snowflake_pool import snowflake_pool
 import logging
+from typing import Callable
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB limit
+
 
 class FileService:
     def __init__(self):
@@ -27,10 +31,6 @@ class FileService:
         )
         self.bucket_name = os.getenv('S3_BUCKET_NAME')
 
-        # Snowflake Setup
-        snowflake_config = get_snowflake_config()
-        self.snowflake_conn = snowflake.connector.connect(**snowflake_config)
-
         # Content Processor for enhanced text extraction
         self.content_processor = ContentProcessor()
 
@@ -39,65 +39,87 @@ class FileService:
 
     async def upload_file(self, file: UploadFile, doc_id: str = None):
         """Upload and process a file with comprehensive error handling"""
+        file_content = await file.read()
+        return await self.upload_bytes(file_content, file.filename, file.content_type, doc_id)
+
+    def validate_upload(self, filename: str, file_content: bytes):
+        """Reject uploads without a name, empty files and files over the size limit"""
+        if not filename:
+            raise HTTPException(
+                status_code=400, detail="No filename provided")
+
+        if len(file_content) > MAX_FILE_SIZE:
+            raise HTTPException(
+                status_code=400,
+                detail=f"File too large. Maximum size: {MAX_FILE_SIZE // (1024*1024)}MB"
+            )
+
+        if len(file_content) == 0:
+            raise HTTPException(status_code=400, detail="File is empty")
+
+    async def upload_bytes(self, file_content: bytes, filename: str, content_type: str = None,
+                           doc_id: str = None, progress_callback: Callable = None):
+        """Store, extract and register an already-read upload.
+
+        progress_callback(stage, message, progress) is called as the file moves
+        through the "uploaded" and "extracting" stages. A byte-identical file
+        that was already processed is not re-uploaded or re-extracted; its
+        doc_id is returned as "duplicate_of" so its chunks can be copied.
+        """
         try:
             # Validate file
-            if not file.filename:
-                raise HTTPException(
-                    status_code=400, detail="No filename provided")
+            self.validate_upload(filename, file_content)
 
             # Generate document ID
             if doc_id is None:
                 doc_id = str(uuid.uuid4())
 
-            print(f"Processing file: {file.filename}")
+            print(f"Processing file: {filename}")
 
-            # Read file content with size validation
-            MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB limit
-            file_content = await file.read()
-
-            if len(file_content) > MAX_FILE_SIZE:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"File too large. Maximum size: {MAX_FILE_SIZE // (1024*1024)}MB"
-                )
-
-            if len(file_content) == 0:
-                raise HTTPException(status_code=400, detail="File is empty")
+            content_hash = file_content_hash(file_content)
+            duplicate = self._find_processed_duplicate(content_hash)
+            if duplicate is not None:
+                return self._register_duplicate(
+                    duplicate, doc_id, filename, file_content, content_type, content_hash, progress_callback)
 
             # Upload to S3 with error handling
-            s3_key = f"documents/{doc_id}/{file.filename}"
+            s3_key = f"documents/{doc_id}/{filename}"
             try:
                 self.s3_client.put_object(
                     Bucket=self.bucket_name,
                     Key=s3_key,
                     Body=file_content,
-                    ContentType=file.content_type,
+                    ContentType=content_type,
                     Metadata={
                         'doc_id': doc_id,
-                        'original_filename': file.filename
+                        'original_filename': filename
                     }
                 )
                 print(f"✅ Uploaded to S3: s3://{self.bucket_name}/{s3_key}")
                 logger.info(f"File uploaded to S3: {s3_key}")
+                if progress_callback:
+                    progress_callback("uploaded", f"Stored {filename} in S3", 0.2)
 
             except Exception as e:
-                logger.error(f"S3 upload failed for {file.filename}: {str(e)}")
+                logger.error(f"S3 upload failed for {filename}: {str(e)}")
                 raise HTTPException(
                     status_code=500,
                     detail=f"S3 upload failed: {str(e)}"
                 )
 
             # Extract text with error handling
+            if progress_callback:
+                progress_callback("extracting", f"Extracting text from {filename}", 0.3)
             try:
-                text_content = await self._extract_text(file_content, file.filename, doc_id=doc_id)
+                text_content = await self._extract_text(file_content, filename, doc_id=doc_id)
                 if not text_content or len(text_content.strip()) == 0:
                     raise ValueError("No text content extracted from file")
                 print(f"✅ Extracted {len(text_content)} characters of text")
-                logger.info(f"Text extraction successful for {file.filename}")
+                logger.info(f"Text extraction successful for {filename}")
 
             except Exception as e:
                 logger.error(
-                    f"Text extraction failed for {file.filename}: {str(e)}")
+                    f"Text extraction failed for {filename}: {str(e)}")
                 # Clean up S3 upload if text extraction fails
                 try:
                     self.s3_client.delete_object(
@@ -114,19 +136,12 @@ class FileService:
 
             # Store in Snowflake with error handling
             try:
-                cursor = self.snowflake_conn.cursor()
-                cursor.execute("""
-                    INSERT INTO documents (doc_id, filename, s3_key, file_size, file_type, text_content, status)
-                    VALUES (%s, %s, %s, %s, %s, %s, 'uploaded')
-                """, (doc_id, file.filename, s3_key, len(file_content), file.content_type, text_content))
-
-                self.snowflake_conn.commit()
-                print(f"✅ Stored metadata in Snowflake")
-                logger.info(f"Database record created for {file.filename}")
+                self._insert_document_record(
+                    doc_id, filename, s3_key, len(file_content), content_type, text_content, content_hash)
 
             except Exception as e:
                 logger.error(
-                    f"Database operation failed for {file.filename}: {str(e)}")
+                    f"Database operation failed for {filename}: {str(e)}")
                 # Clean up S3 upload if database operation fails
                 try:
                     self.s3_client.delete_object(
@@ -141,42 +156,17 @@ class FileService:
                     detail=f"Database operation failed: {str(e)}"
                 )
 
-            # Register document with session manager
-            try:
-                content_summary = text_content[:500] + \
-                    "..." if len(text_content) > 500 else text_content
-                print(
-                    f"📝 Adding document to session: {doc_id} - {file.filename}")
-
-                # Create a new session if none exists
-                session_id = self.session_manager.create_session()
-                self.session_manager.add_document(
-                    session_id=session_id,
-                    doc_id=doc_id,
-                    filename=file.filename,
-                    content_summary=content_summary,
-                    file_type=file.content_type
-                )
-                print(f"✅ Registered document with session manager")
-                print(
-                    f"📊 Session {session_id} now has {self.session_manager.sessions[session_id]['document_count']} documents")
-                logger.info(
-                    f"Document registered with session manager: {doc_id}")
-
-            except Exception as e:
-                logger.error(
-                    f"Session management failed for {file.filename}: {str(e)}")
-                # Note: Don't clean up S3/DB here as they're already stored
-                # Just log the error and continue
-                print(f"⚠️ Session management failed: {e}")
+            session_id = self._register_with_session(
+                doc_id, filename, text_content, content_type)
 
             return {
                 "success": True,
                 "doc_id": doc_id,
                 "session_id": session_id,
-                "filename": file.filename,
+                "filename": filename,
                 "s3_url": f"s3://{self.bucket_name}/{s3_key}",
-                "text_content": text_content
+                "text_content": text_content,
+                "duplicate_of": None
             }
 
         except HTTPException:
@@ -184,29 +174,126 @@ class FileService:
             raise
         except Exception as e:
             logger.error(
-                f"Unexpected error in upload_file for {file.filename}: {str(e)}")
+                f"Unexpected error in upload_file for {filename}: {str(e)}")
             raise HTTPException(
                 status_code=500,
                 detail=f"Unexpected error during file processing: {str(e)}"
             )
 
-    def get_snowflake_connection(self):
-        """Get a fresh Snowflake connection with error handling"""
+    def _insert_document_record(self, doc_id: str, filename: str, s3_key: str, file_size: int,
+                                content_type: str, text_content: str, content_hash: str):
+        with snowflake_pool.connection() as conn:
+            cursor = conn.cursor()
+            if has_content_hash_columns():
+                cursor.execute("""
+                    INSERT INTO documents (doc_id, filename, s3_key, file_size, file_type, text_content, content_hash, status)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, 'uploaded')
+                """, (doc_id, filename, s3_key, file_size, content_type, text_content, content_hash))
+            else:
+                cursor.execute("""
+                    INSERT INTO documents (doc_id, filename, s3_key, file_size, file_type, text_content, status)
+                    VALUES (%s, %s, %s, %s, %s, %s, 'uploaded')
+                """, (doc_id, filename, s3_key, file_size, content_type, text_content))
+
+            conn.commit()
+        print(f"✅ Stored metadata in Snowflake")
+        logger.info(f"Database record created for {filename}")
+
+    def _find_processed_duplicate(self, content_hash: str):
+        """Return (doc_id, s3_key, text_content) of a processed upload with the same bytes"""
+        if not has_content_hash_columns():
+            return None
+        try:
+            with snowflake_pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT doc_id, s3_key, text_content
+                    FROM documents
+                    WHERE content_hash = %s AND status = 'processed'
+                    ORDER BY upload_timestamp DESC
+                    LIMIT 1
+                """, (content_hash,))
+                return cursor.fetchone()
+        except Exception as e:
+            logger.warning(f"Duplicate lookup failed, processing upload normally: {e}")
+            return None
+
+    def _register_duplicate(self, duplicate, doc_id: str, filename: str, file_content: bytes,
+                            content_type: str, content_hash: str, progress_callback: Callable = None):
+        """Record a re-upload that shares the stored S3 object and extracted text"""
+        source_doc_id, s3_key, text_content = duplicate
+        print(f"♻️ {filename} matches processed document {source_doc_id}, skipping upload and extraction")
+        if progress_callback:
+            progress_callback("uploaded", f"Reusing stored copy of {filename}", 0.2)
+
+        try:
+            self._insert_document_record(
+                doc_id, filename, s3_key, len(file_content), content_type, text_content, content_hash)
+        except Exception as e:
+            logger.error(
+                f"Database operation failed for {filename}: {str(e)}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Database operation failed: {str(e)}"
+            )
+
+        source_metadata = self.session_manager.get_pdf_metadata(source_doc_id)
+        if source_metadata:
+            self.session_manager.store_pdf_metadata(doc_id, source_metadata["metadata"])
+
+        session_id = self._register_with_session(
+            doc_id, filename, text_content, content_type)
+
+        return {
+            "success": True,
+            "doc_id": doc_id,
+            "session_id": session_id,
+            "filename": filename,
+            "s3_url": f"s3://{self.bucket_name}/{s3_key}",
+            "text_content": text_content,
+            "duplicate_of": source_doc_id
+        }
+
+    def _register_with_session(self, doc_id: str, filename: str, text_content: str, content_type: str):
+        """Add the document to a new session; failures are logged, not raised"""
+        session_id = None
         try:
-            snowflake_config = get_snowflake_config()
-            if not all(snowflake_config.values()):
-                raise ValueError("Incomplete Snowflake configuration")
+            content_summary = text_content[:500] + \
+                "..." if len(text_content) > 500 else text_content
+            print(
+                f"📝 Adding document to session: {doc_id} - {filename}")
+
+            # Create a new session if none exists
+            session_id = self.session_manager.create_session()
+            self.session_manager.add_document(
+                session_id=session_id,
+                doc_id=doc_id,
+                filename=filename,
+                content_summary=content_summary,
+                file_type=content_type
+            )
+            print(f"✅ Registered document with session manager")
+            print(
+                f"📊 Session {session_id} now has {self.session_manager.sessions[session_id]['document_count']} documents")
+            logger.info(
+                f"Document registered with session manager: {doc_id}")
+
+        except Exception as e:
+            logger.error(
+                f"Session management failed for {filename}: {str(e)}")
+            # Note: Don't clean up S3/DB here as they're already stored
+            # Just log the error and continue
+            print(f"⚠️ Session management failed: {e}")
 
-            connection = snowflake.connector.connect(**snowflake_config)
+        return session_id
 
-            # Test the connection
-            cursor = connection.cursor()
-            cursor.execute("SELECT 1")
-            cursor.fetchone()
-            cursor.close()
+    def get_snowflake_connection(self):
+        """Check out a pooled Snowflake connection; close() returns it to the pool.
 
-            logger.info("Snowflake connection established successfully")
-            return connection
+        The pool health-checks idle connections, so no SELECT 1 is needed here.
+        """
+        try:
+            return snowflake_pool.acquire()
 
         except Exception as e:
             logger.error(f"Failed to establish Snowflake connection: {str(e)}")
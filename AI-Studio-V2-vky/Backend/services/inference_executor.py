@@ -0,0 +1,147 @@
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from fastapi import HTTPException
+
+# Intra-op threads per torch forward pass; several lanes encoding at once
+# should not oversubscribe the CPU cores
+INFERENCE_TORCH_THREADS = int(os.getenv("INFERENCE_TORCH_THREADS", "2"))
+# How long a caller waits for a free slot before the request is rejected
+INFERENCE_QUEUE_TIMEOUT = float(os.getenv("INFERENCE_QUEUE_TIMEOUT", "10"))
+
+
+def configure_torch_threads(num_threads: int = INFERENCE_TORCH_THREADS):
+    """Cap torch intra-op parallelism for the encoder (no-op without torch)"""
+    try:
+        import torch
+        torch.set_num_threads(max(1, num_threads))
+        print(f"🧵 torch intra-op threads capped at {torch.get_num_threads()}")
+    except ImportError:
+        pass
+
+
+class InferenceExecutor:
+    """Awaitable thread pool lane for blocking model and database calls.
+
+    At most `max_workers` calls run at once and at most `max_pending` may be
+    admitted (running plus queued). Callers beyond that wait for a slot and
+    get a 503 after INFERENCE_QUEUE_TIMEOUT seconds, so a burst of uploads
+    cannot build an unbounded backlog in front of chat queries.
+
+    Admission uses a thread-level semaphore rather than an asyncio one
+    because ingestion workers run their own event loops.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_pending: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max(max_pending, max_workers)
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_ms = 0.0
+        self.total_run_ms = 0.0
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) on this lane and await its result"""
+        queued_at = time.perf_counter()
+        await self._acquire_slot()
+        return await asyncio.wrap_future(self._submit_admitted(queued_at, fn, *args, **kwargs))
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Blocking-admission variant of run() for callers on plain threads"""
+        queued_at = time.perf_counter()
+        if not self._slots.acquire(timeout=INFERENCE_QUEUE_TIMEOUT):
+            self._reject()
+        return self._submit_admitted(queued_at, fn, *args, **kwargs)
+
+    def _submit_admitted(self, queued_at: float, fn: Callable, *args, **kwargs) -> Future:
+        with self._lock:
+            self.pending += 1
+
+        def timed_call():
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    self.total_wait_ms += (started - queued_at) * 1000
+                    self.total_run_ms += (finished - started) * 1000
+
+        def release(_future):
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+            self._slots.release()
+
+        future = self.executor.submit(timed_call)
+        future.add_done_callback(release)
+        return future
+
+    async def _acquire_slot(self):
+        if self._slots.acquire(blocking=False):
+            return
+        deadline = time.monotonic() + INFERENCE_QUEUE_TIMEOUT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.005)
+            if self._slots.acquire(blocking=False):
+                return
+        self._reject()
+
+    def _reject(self):
+        with self._lock:
+            self.rejected += 1
+        print(f"⚠️ {self.name} executor saturated ({self.max_pending} pending)")
+        raise HTTPException(
+            status_code=503, detail=f"{self.name} executor is busy, try again shortly")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            completed = self.completed
+            return {
+                "max_workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "completed": completed,
+                "rejected": self.rejected,
+                "avg_queue_wait_ms": round(self.total_wait_ms / completed, 2) if completed else 0.0,
+                "avg_run_ms": round(self.total_run_ms / completed, 2) if completed else 0.0,
+            }
+
+
+# Interactive query encodes get their own lane so document ingestion never
+# queues in front of chat; Snowflake cursor calls run on a separate lane.
+query_inference = InferenceExecutor(
+    "query-inference",
+    max_workers=int(os.getenv("QUERY_INFERENCE_WORKERS", "2")),
+    max_pending=int(os.getenv("QUERY_INFERENCE_MAX_PENDING", "64")))
+bulk_inference = InferenceExecutor(
+    "bulk-inference",
+    max_workers=int(os.getenv("BULK_INFERENCE_WORKERS", "1")),
+    max_pending=int(os.getenv("BULK_INFERENCE_MAX_PENDING", "8")))
+db_executor = InferenceExecutor(
+    "snowflake-io",
+    max_workers=int(os.getenv("DB_EXECUTOR_WORKERS", "4")),
+    max_pending=int(os.getenv("DB_EXECUTOR_MAX_PENDING", "64")))
+# Cursor calls of async_db queries on connections they already hold. Nothing
+# on this lane waits for a pool slot, and there is one worker per pool slot,
+# so a query holding a connection can always make progress even while every
+# snowflake-io worker is blocked checking one out.
+db_async_executor = InferenceExecutor(
+    "snowflake-async",
+    max_workers=int(os.getenv("SNOWFLAKE_POOL_SIZE", "8")),
+    max_pending=2 * int(os.getenv("SNOWFLAKE_POOL_SIZE", "8")))
+
+
+def executor_stats() -> Dict:
+    return {lane.name: lane.stats()
+            for lane in (query_inference, bulk_inference, db_executor, db_async_executor)}
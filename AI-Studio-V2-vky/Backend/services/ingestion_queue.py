@@ -0,0 +1,153 @@
+import os
+import uuid
+import asyncio
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor, Future
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+
+# Uploads processed at the same time; the rest wait in the executor queue
+INGESTION_CONCURRENCY = int(os.getenv("INGESTION_CONCURRENCY", "2"))
+# Finished jobs kept for status lookups before the oldest are dropped
+INGESTION_JOB_HISTORY = int(os.getenv("INGESTION_JOB_HISTORY", "500"))
+
+FINAL_STATES = ("processed", "failed")
+
+
+class IngestionQueue:
+    """Background document ingestion with a bounded worker pool.
+
+    Each job runs upload -> text extraction -> embedding -> chunk storage
+    on a worker thread with its own event loop, so the blocking S3,
+    parsing, model and Snowflake work stays off the API event loop.
+    Job states: queued -> uploaded -> extracting -> embedding -> processed
+    (or failed).
+    """
+
+    def __init__(self, file_service, embedding_service, max_workers: int = INGESTION_CONCURRENCY):
+        self.file_service = file_service
+        self.embedding_service = embedding_service
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="ingestion")
+        self.jobs: Dict[str, Dict] = {}
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, file_content: bytes, filename: str, content_type: str = None) -> Dict:
+        """Queue an upload and return its job record immediately"""
+        job_id = str(uuid.uuid4())
+        now = datetime.now().isoformat()
+        job = {
+            "job_id": job_id,
+            "doc_id": str(uuid.uuid4()),
+            "filename": filename,
+            "status": "queued",
+            "progress": 0.0,
+            "message": "Waiting for an ingestion worker",
+            "session_id": None,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        with self._lock:
+            self.jobs[job_id] = job
+            self._prune_history()
+            self._futures[job_id] = self.executor.submit(
+                self._run_job, job_id, file_content, content_type)
+
+        print(f"📥 Queued ingestion job {job_id} for {filename}")
+        return dict(job)
+
+    async def wait(self, job_id: str) -> Dict:
+        """Await a job's completion without blocking the event loop"""
+        future = self._futures.get(job_id)
+        if future is not None:
+            await asyncio.wrap_future(future)
+        return self.get_job(job_id)
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list_jobs(self) -> List[Dict]:
+        with self._lock:
+            return [dict(job) for job in self.jobs.values()]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for job in self.jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return {
+            "max_workers": self.max_workers,
+            "jobs_by_status": counts,
+        }
+
+    def _update(self, job_id: str, status: str, message: str, progress: float = None, **fields):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+            job["status"] = status
+            job["message"] = message
+            if progress is not None:
+                job["progress"] = round(progress, 2)
+            job["updated_at"] = datetime.now().isoformat()
+            job.update(fields)
+
+    def _prune_history(self):
+        finished = [job_id for job_id, job in self.jobs.items()
+                    if job["status"] in FINAL_STATES]
+        for job_id in finished[:max(0, len(finished) - INGESTION_JOB_HISTORY)]:
+            self.jobs.pop(job_id, None)
+            self._futures.pop(job_id, None)
+
+    def _run_job(self, job_id: str, file_content: bytes, content_type: str):
+        asyncio.run(self._process(job_id, file_content, content_type))
+
+    async def _process(self, job_id: str, file_content: bytes, content_type: str):
+        job = self.get_job(job_id)
+
+        def report(stage: str, message: str, progress: float = None):
+            self._update(job_id, stage, message, progress)
+
+        try:
+            upload_result = await self.file_service.upload_bytes(
+                file_content,
+                job["filename"],
+                content_type,
+                doc_id=job["doc_id"],
+                progress_callback=report,
+            )
+            self._update(job_id, "embedding", "Text extracted, chunking and embedding", 0.4,
+                         session_id=upload_result.get("session_id"))
+
+            embedding_result = await self.embedding_service.process_document(
+                doc_id=job["doc_id"],
+                text_content=upload_result["text_content"],
+                progress_callback=report,
+                source_doc_id=upload_result.get("duplicate_of"),
+            )
+
+            upload_result.pop("text_content", None)
+            upload_result["embedding_result"] = embedding_result
+            final_status = "processed" if embedding_result.get(
+                "status") == "processed" else "failed"
+            self._update(job_id, final_status,
+                         f"Created {embedding_result.get('chunks_created', 0)} chunks",
+                         1.0, result=upload_result)
+            print(f"✅ Ingestion job {job_id} finished: {final_status}")
+
+        except HTTPException as e:
+            self._update(job_id, "failed", "Ingestion failed", 1.0, error=e.detail)
+            print(f"❌ Ingestion job {job_id} failed: {e.detail}")
+        except Exception as e:
+            traceback.print_exc()
+            self._update(job_id, "failed", "Ingestion failed", 1.0, error=str(e))
+            print(f"❌ Ingestion job {job_id} failed: {e}")
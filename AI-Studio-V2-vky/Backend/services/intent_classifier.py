@@ -0,0 +1,184 @@
+import os
+import re
+import logging
+import threading
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+from services.embedding_cache import normalize_text
+from services.inference_executor import query_inference
+
+logger = logging.getLogger(__name__)
+
+INTENTS = ("GREETING", "CONVERSATIONAL", "QUESTION")
+
+# Below either threshold the embedding vote is not trusted and the LLM decides
+INTENT_MIN_SIMILARITY = float(os.getenv("INTENT_MIN_SIMILARITY", "0.55"))
+INTENT_MIN_MARGIN = float(os.getenv("INTENT_MIN_MARGIN", "0.05"))
+# Greetings and acknowledgements are short; longer inputs are treated as questions
+INTENT_MAX_SHORT_WORDS = int(os.getenv("INTENT_MAX_SHORT_WORDS", "8"))
+
+# Exact (normalized, punctuation stripped) inputs that need no model at all
+GREETING_PHRASES = {
+    "hi", "hello", "hey", "hiya", "yo", "sup", "greetings", "salutations",
+    "hi there", "hello there", "hey there", "good morning", "good afternoon",
+    "good evening", "good night", "good day", "morning", "evening",
+    "how are you", "how are you doing", "hows it going", "how is it going",
+    "whats up", "what is up", "nice to meet you", "pleasure to meet you",
+    "good to see you", "nice to see you",
+}
+CONVERSATIONAL_PHRASES = {
+    "ok", "okay", "k", "kk", "thanks", "thank you", "thx", "ty", "thanks a lot",
+    "thank you so much", "got it", "yes", "yeah", "yep", "no", "nope", "cool",
+    "great", "nice", "awesome", "perfect", "sounds good", "makes sense",
+    "i see", "alright", "all right", "sure", "fine", "understood", "noted",
+    "never mind", "nevermind", "that helps", "ok thanks", "okay thanks",
+    "great thanks", "bye", "goodbye", "see you",
+}
+QUESTION_START = re.compile(
+    r"^(what|whats|how|why|when|where|who|whom|which|whose|can|could|would|should|"
+    r"is|are|was|were|does|do|did|will|explain|describe|summari[sz]e|list|compare|"
+    r"tell|show|give|define|find|calculate|translate|write)\b"
+)
+
+# Labelled examples the embedding vote is taken against
+INTENT_PROTOTYPES = {
+    "GREETING": [
+        "hi", "hello there", "hey, how are you", "good morning",
+        "good evening to you", "what's up", "nice to meet you",
+        "hello, how's it going", "hey friend",
+    ],
+    "CONVERSATIONAL": [
+        "okay", "thanks a lot", "got it", "yes please", "no thanks",
+        "cool, that makes sense", "sounds good to me", "perfect, thank you",
+        "alright I see", "never mind", "that was helpful", "great job",
+    ],
+    "QUESTION": [
+        "what is machine learning", "how does this method work",
+        "can you explain the results", "summarize the document",
+        "tell me about the study design", "what does table 2 show",
+        "why did the accuracy drop", "list the key findings",
+        "compare the two approaches", "give me an example",
+        "explain this in simple terms", "what are the side effects of the drug",
+    ],
+}
+
+
+class IntentClassifier:
+    """Local GREETING / CONVERSATIONAL / QUESTION classifier with LLM escalation.
+
+    Exact phrases and question patterns are decided by rules. Everything
+    else is embedded with the already-loaded query encoder and voted against
+    labelled prototypes; only when that vote is weak (low similarity or a
+    small margin between the top two intents) is the LLM asked.
+    """
+
+    def __init__(self, embed: Callable[[str], Awaitable[np.ndarray]],
+                 encode_batch: Callable[[List[str]], np.ndarray],
+                 min_similarity: float = INTENT_MIN_SIMILARITY,
+                 min_margin: float = INTENT_MIN_MARGIN):
+        self.embed = embed
+        self.encode_batch = encode_batch
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self._prototypes: Optional[np.ndarray] = None
+        self._prototype_labels: List[str] = []
+        self._prototype_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.routes = {"rules": 0, "embedding": 0, "llm": 0, "llm_failed": 0}
+        self.intents = {intent: 0 for intent in INTENTS}
+
+    @staticmethod
+    def _canonical(text: str) -> str:
+        text = normalize_text(text)
+        text = re.sub(r"[^\w\s]", "", text)
+        return re.sub(r"\s+", " ", text).strip()
+
+    def _classify_by_rules(self, text: str) -> Optional[str]:
+        canonical = self._canonical(text)
+        if canonical in GREETING_PHRASES:
+            return "GREETING"
+        if canonical in CONVERSATIONAL_PHRASES:
+            return "CONVERSATIONAL"
+        if (not canonical or "?" in text or QUESTION_START.match(canonical)
+                or len(canonical.split()) > INTENT_MAX_SHORT_WORDS):
+            return "QUESTION"
+        return None
+
+    def _prototype_matrix(self) -> np.ndarray:
+        """Encode the prototypes once per process (runs on the inference lane)"""
+        with self._prototype_lock:
+            if self._prototypes is None:
+                texts, labels = [], []
+                for intent, examples in INTENT_PROTOTYPES.items():
+                    texts.extend(examples)
+                    labels.extend([intent] * len(examples))
+                self._prototype_labels = labels
+                self._prototypes = self.encode_batch(texts)
+            return self._prototypes
+
+    async def _classify_by_embedding(self, text: str) -> Dict:
+        prototypes = self._prototypes
+        if prototypes is None:
+            prototypes = await query_inference.run(self._prototype_matrix)
+        query = await self.embed(text)
+
+        similarities = prototypes @ query
+        scores = {intent: -1.0 for intent in INTENTS}
+        for label, similarity in zip(self._prototype_labels, similarities):
+            scores[label] = max(scores[label], float(similarity))
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        (best, best_score), (_, runner_up) = ranked[0], ranked[1]
+        return {
+            "intent": best,
+            "similarity": round(best_score, 4),
+            "margin": round(best_score - runner_up, 4),
+            "confident": best_score >= self.min_similarity and best_score - runner_up >= self.min_margin,
+        }
+
+    def _record(self, route: str, intent: str):
+        with self._stats_lock:
+            self.routes[route] += 1
+            self.intents[intent] += 1
+
+    async def classify(self, text: str, escalate: Callable[[str], Awaitable[str]]) -> str:
+        """Return the intent, calling `escalate(text)` only when the local vote is weak"""
+        intent = self._classify_by_rules(text)
+        if intent is not None:
+            self._record("rules", intent)
+            return intent
+
+        guess = None
+        try:
+            guess = await self._classify_by_embedding(text)
+            if guess["confident"]:
+                self._record("embedding", guess["intent"])
+                return guess["intent"]
+            print(f"🤔 Low-confidence intent {guess}, escalating to LLM")
+        except Exception as e:
+            logger.warning(f"Embedding intent classification failed: {e}")
+
+        try:
+            intent = await escalate(text)
+            self._record("llm", intent)
+            return intent
+        except Exception as e:
+            logger.error(f"LLM intent escalation failed: {e}")
+            intent = guess["intent"] if guess else "QUESTION"
+            self._record("llm_failed", intent)
+            return intent
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            total = sum(self.routes.values())
+            escalated = self.routes["llm"] + self.routes["llm_failed"]
+            return {
+                "classified": total,
+                "routes": dict(self.routes),
+                "intents": dict(self.intents),
+                "escalations": escalated,
+                "escalation_rate": round(escalated / total, 4) if total else 0.0,
+                "min_similarity": self.min_similarity,
+                "min_margin": self.min_margin,
+            }
@@ -0,0 +1,34 @@
+import threading
+from typing import Any, Callable
+
+from utils.startup_timing import startup_timer
+
+
+class LazyService:
+    """Module-level stand-in for a service that is only constructed on first use.
+
+    Attribute access is forwarded to the real instance, so callers keep
+    writing `embedding_service.find_relevant_chunks(...)`. Construction is
+    guarded by a lock and timed in the startup report.
+    """
+
+    def __init__(self, factory: Callable[[], Any], name: str = None):
+        self._factory = factory
+        self._name = name or getattr(factory, "__name__", "service")
+        self._instance = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._instance is not None
+
+    def get(self) -> Any:
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    with startup_timer.phase(f"init {self._name}"):
+                        self._instance = self._factory()
+        return self._instance
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self.get(), attr)
@@ -0,0 +1,134 @@
+import os
+import time
+import queue
+import asyncio
+import bisect
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, List
+
+import numpy as np
+from fastapi import HTTPException
+
+# How long the first query of a batch waits for others to join
+QUERY_BATCH_WAIT_MS = float(os.getenv("QUERY_BATCH_WAIT_MS", "5"))
+QUERY_BATCH_MAX_SIZE = int(os.getenv("QUERY_BATCH_MAX_SIZE", "32"))
+# Queries waiting to be batched before new ones are rejected
+QUERY_BATCH_MAX_QUEUE = int(os.getenv("QUERY_BATCH_MAX_QUEUE", "256"))
+
+
+class Histogram:
+    """Fixed-bucket counter; bucket i counts values <= bounds[i], the last bucket the rest"""
+
+    def __init__(self, bounds: List[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.samples = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.samples += 1
+
+    def snapshot(self) -> Dict:
+        labels = [f"<={bound:g}" for bound in self.bounds] + [f">{self.bounds[-1]:g}"]
+        return {
+            "buckets": dict(zip(labels, self.counts)),
+            "count": self.samples,
+            "mean": round(self.total / self.samples, 3) if self.samples else 0.0,
+        }
+
+
+class QueryEmbeddingBatcher:
+    """Coalesces concurrent single-query encodes into batched forward passes.
+
+    Callers enqueue a query and await a future. A dispatcher thread takes the
+    first waiting query, gathers whatever else arrives within
+    QUERY_BATCH_WAIT_MS (up to QUERY_BATCH_MAX_SIZE), and hands the batch to
+    the query inference lane as one encode call. Results are fanned back out
+    to each caller's future. A thread is used instead of an asyncio task
+    because queries arrive from more than one event loop.
+    """
+
+    def __init__(self, encode_batch: Callable[[List[str]], np.ndarray], executor,
+                 max_batch_size: int = QUERY_BATCH_MAX_SIZE,
+                 max_wait_ms: float = QUERY_BATCH_WAIT_MS,
+                 max_queue: int = QUERY_BATCH_MAX_QUEUE):
+        self.encode_batch = encode_batch
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self.batch_sizes = Histogram([1, 2, 4, 8, 16, 32, 64])
+        self.queue_wait_ms = Histogram([1, 2, 5, 10, 25, 50, 100, 250])
+        self._thread = threading.Thread(
+            target=self._dispatch_loop, name="query-batcher", daemon=True)
+        self._thread.start()
+
+    async def embed(self, text: str) -> np.ndarray:
+        """Await the unit-length embedding of one query"""
+        future: Future = Future()
+        try:
+            self._queue.put_nowait((text, future, time.perf_counter()))
+        except queue.Full:
+            raise HTTPException(
+                status_code=503, detail="Query embedding queue is full, try again shortly")
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_ms,
+                "batch_size": self.batch_sizes.snapshot(),
+                "queue_wait_ms": self.queue_wait_ms.snapshot(),
+            }
+
+    def _collect_batch(self) -> List:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _dispatch_loop(self):
+        while True:
+            batch = self._collect_batch()
+            dispatched_at = time.perf_counter()
+            with self._lock:
+                self.batch_sizes.observe(len(batch))
+                for _, _, enqueued_at in batch:
+                    self.queue_wait_ms.observe((dispatched_at - enqueued_at) * 1000)
+
+            texts = [text for text, _, _ in batch]
+            try:
+                encoded = self.executor.submit(self.encode_batch, texts)
+            except Exception as e:
+                self._fail(batch, e)
+                continue
+            encoded.add_done_callback(
+                lambda done, batch=batch: self._fan_out(batch, done))
+
+    def _fan_out(self, batch: List, done: Future):
+        error = done.exception()
+        if error is not None:
+            self._fail(batch, error)
+            return
+        vectors = done.result()
+        for row, (_, future, _) in enumerate(batch):
+            if not future.done():
+                future.set_result(vectors[row])
+
+    def _fail(self, batch: List, error: BaseException):
+        for _, future, _ in batch:
+            if not future.done():
+                future.set_exception(error)
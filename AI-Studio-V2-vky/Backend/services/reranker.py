@@ -1,19 +1,42 @@
-import openai
+import asyncio
 import logging
 from typing import List, Dict, Tuple
 import os
 from config import Settings
 from dotenv import load_dotenv
+from openai import AsyncOpenAI
+from services.encoder_backends import get_cross_encoder, cross_encoder_scores
+from services.inference_executor import query_inference
+from services.embedding_cache import rerank_score_cache
+from utils.content_hash import chunk_content_hash
+from services.bm25_index import BM25Document, bm25_search
 
 load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
 
 settings = Settings()
 logger = logging.getLogger(__name__)
 
+# cross_encoder (local CPU model, one batched pass) or llm (gpt-4o-mini prompts)
+RERANKER_BACKEND = os.getenv("RERANKER_BACKEND", "cross_encoder").lower()
+CROSS_ENCODER_MODEL = os.getenv("CROSS_ENCODER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+# torch, onnx or openvino
+CROSS_ENCODER_BACKEND = os.getenv("CROSS_ENCODER_BACKEND", "torch").lower()
+CROSS_ENCODER_BATCH_SIZE = int(os.getenv("CROSS_ENCODER_BATCH_SIZE", "64"))
+RERANKER_BACKENDS = ("cross_encoder", "llm")
+# LLM scorer: passages per prompt, prompts in flight per request, and the
+# wall-clock budget after which unscored passages keep their cosine score
+LLM_RERANK_BATCH_SIZE = int(os.getenv("LLM_RERANK_BATCH_SIZE", "5"))
+LLM_RERANK_CONCURRENCY = int(os.getenv("LLM_RERANK_CONCURRENCY", "4"))
+LLM_RERANK_BUDGET_SECONDS = float(os.getenv("LLM_RERANK_BUDGET_SECONDS", "3"))
+
 class RerankerService:
-    def __init__(self):
+    def __init__(self, backend: str = RERANKER_BACKEND):
+        if backend not in RERANKER_BACKENDS:
+            print(f"⚠️ Unknown RERANKER_BACKEND '{backend}', using cross_encoder")
+            backend = "cross_encoder"
+        self.backend = backend
         self.openai_model = "gpt-4o-mini"
+        self._openai_client = None
         self.section_weights = {
             "METHODS": 1.8, "METHOD": 1.8, "RESULTS": 1.6,
             "TABLE": 1.7, "FIGURE": 1.5,  # Boost tables and figures
@@ -22,8 +45,13 @@ class RerankerService:
             "SUPPLEMENTARY": 1.1, "OTHER": 1.0
         }
     
+    async def warm_up(self):
+        """Load the local cross-encoder and score one pair so the first chat is not cold"""
+        if self.backend == "cross_encoder":
+            await self._cross_encoder_rerank("warm up", [{"text": "warm up"}])
+
     async def batch_rerank(self, query: str, chunks: List[Dict], top_k: int = 5) -> List[Dict]:
-        """Enhanced LLM-based reranking with cross-encoder approach"""
+        """Cross-encoder reranking (local model or LLM scorer) with section and content boosting"""
         
         if not chunks:
             return []
@@ -33,8 +61,7 @@ class RerankerService:
             return [{"passage": chunk, "score": 1.0} for chunk in chunks]
         
         try:
-            # Use LLM-based cross-encoder reranking
-            scored_chunks = await self._llm_cross_encoder_rerank(query, chunks)
+            scored_chunks = await self._score_with_cache(query, chunks)
             
             # Apply section-based boosting
             boosted_chunks = self._apply_section_boosting(scored_chunks)
@@ -47,55 +74,117 @@ class RerankerService:
             return final_chunks[:top_k]
             
         except Exception as e:
-            logger.error(f"LLM reranking failed, falling back to simple reranking: {e}")
+            logger.error(f"{self.backend} reranking failed, falling back to simple reranking: {e}")
             return self._simple_fallback_rerank(query, chunks, top_k)
     
+    @property
+    def scorer_id(self) -> str:
+        """Identifies the scoring model in rerank cache keys"""
+        if self.backend == "cross_encoder":
+            return f"cross_encoder:{CROSS_ENCODER_MODEL}"
+        return f"llm:{self.openai_model}"
+
+    async def _score_with_cache(self, query: str, chunks: List[Dict]) -> List[Dict]:
+        """Relevance scores before boosting; only pairs missing from the cache are scored"""
+        scorer_id = self.scorer_id
+        hashes = [chunk_content_hash(chunk["text"], scorer_id) for chunk in chunks]
+        scores = rerank_score_cache.get_many(scorer_id, query, hashes)
+
+        missing = [i for i, content_hash in enumerate(hashes) if content_hash not in scores]
+        if missing:
+            to_score = [chunks[i] for i in missing]
+            if self.backend == "cross_encoder":
+                fresh = await self._cross_encoder_rerank(query, to_score)
+            else:
+                fresh = await self._llm_cross_encoder_rerank(query, to_score)
+
+            # Cosine fallbacks from failed or over-budget LLM batches are not cached
+            new_scores = {hashes[i]: item["score"]
+                          for i, item in zip(missing, fresh) if not item.get("fallback")}
+            rerank_score_cache.put_many(scorer_id, query, new_scores)
+            for i, item in zip(missing, fresh):
+                scores.setdefault(hashes[i], item["score"])
+            logger.info(f"Rerank cache: {len(chunks) - len(missing)} of {len(chunks)} pairs reused")
+
+        return [{"passage": chunk, "score": scores[content_hash]}
+                for chunk, content_hash in zip(chunks, hashes)]
+
+    async def _cross_encoder_rerank(self, query: str, chunks: List[Dict]) -> List[Dict]:
+        """Score all query-passage pairs in one batched CPU pass of the local cross-encoder"""
+        pairs = [(query, chunk["text"]) for chunk in chunks]
+        scores = await query_inference.run(self._predict_pairs, pairs)
+        return [{"passage": chunk, "score": float(score)}
+                for chunk, score in zip(chunks, scores)]
+
+    def _predict_pairs(self, pairs: List[Tuple[str, str]]):
+        model = get_cross_encoder(CROSS_ENCODER_MODEL, CROSS_ENCODER_BACKEND)
+        return cross_encoder_scores(model, pairs, batch_size=CROSS_ENCODER_BATCH_SIZE)
+
+    @property
+    def openai_client(self) -> AsyncOpenAI:
+        # Created on first use so the cross-encoder backend needs no OpenAI key
+        if self._openai_client is None:
+            self._openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return self._openai_client
+
     async def _llm_cross_encoder_rerank(self, query: str, chunks: List[Dict]) -> List[Dict]:
-        """Use LLM as cross-encoder to score query-passage relevance"""
+        """Use LLM as cross-encoder; batches run concurrently within a latency budget"""
+        batches = [chunks[i:i + LLM_RERANK_BATCH_SIZE]
+                   for i in range(0, len(chunks), LLM_RERANK_BATCH_SIZE)]
+        semaphore = asyncio.Semaphore(LLM_RERANK_CONCURRENCY)
+        tasks = [asyncio.create_task(self._score_llm_batch(query, batch, semaphore))
+                 for batch in batches]
+
+        done, pending = await asyncio.wait(tasks, timeout=LLM_RERANK_BUDGET_SECONDS)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"LLM rerank exceeded its {LLM_RERANK_BUDGET_SECONDS}s budget; "
+                           f"{len(pending)} of {len(tasks)} batches keep their cosine scores")
+
         scored_chunks = []
-        
-        # Process chunks in batches to avoid token limits
-        batch_size = 5
-        for i in range(0, len(chunks), batch_size):
-            batch = chunks[i:i+batch_size]
-            
-            try:
-                # Create reranking prompt
-                passages_for_prompt = [{"text": chunk["text"][:1000]} for chunk in batch]  # Truncate for token limits
-                prompt = self._create_rerank_prompt(query, passages_for_prompt)
-                
-                response = openai.chat.completions.create(
-                    model=self.openai_model,
-                    messages=[
-                        {"role": "system", "content": prompt["system"]},
-                        {"role": "user", "content": prompt["user"]}
-                    ],
-                    temperature=0,
-                    max_tokens=100
-                )
-                
-                # Parse scores from response
-                scores_text = response.choices[0].message.content.strip()
-                scores = self._parse_rerank_scores(scores_text, len(batch))
-                
-                # Combine chunks with scores
-                for j, chunk in enumerate(batch):
-                    score = scores[j] if j < len(scores) else 0.5
-                    scored_chunks.append({
-                        "passage": chunk,
-                        "score": score
-                    })
-                    
-            except Exception as e:
-                logger.warning(f"Batch reranking failed for batch {i//batch_size + 1}: {e}")
-                # Fallback to neutral scores for this batch
-                for chunk in batch:
-                    scored_chunks.append({
-                        "passage": chunk,
-                        "score": 0.5
-                    })
-        
+        for i, (batch, task) in enumerate(zip(batches, tasks)):
+            scores = None
+            if task in done:
+                try:
+                    scores = task.result()
+                except Exception as e:
+                    logger.warning(f"Batch reranking failed for batch {i + 1}: {e}")
+
+            # Unscored passages (failed or over budget) fall back to their cosine score
+            for j, chunk in enumerate(batch):
+                score = scores[j] if scores is not None else self._base_score(chunk)
+                scored_chunks.append({
+                    "passage": chunk,
+                    "score": score,
+                    "fallback": scores is None
+                })
+
         return scored_chunks
+
+    async def _score_llm_batch(self, query: str, batch: List[Dict], semaphore: asyncio.Semaphore) -> List[float]:
+        """Score one batch of passages with a single LLM call"""
+        async with semaphore:
+            passages_for_prompt = [{"text": chunk["text"][:1000]} for chunk in batch]  # Truncate for token limits
+            prompt = self._create_rerank_prompt(query, passages_for_prompt)
+
+            response = await self.openai_client.chat.completions.create(
+                model=self.openai_model,
+                messages=[
+                    {"role": "system", "content": prompt["system"]},
+                    {"role": "user", "content": prompt["user"]}
+                ],
+                temperature=0,
+                max_tokens=100
+            )
+
+        scores_text = response.choices[0].message.content.strip()
+        return self._parse_rerank_scores(scores_text, len(batch))
+
+    @staticmethod
+    def _base_score(chunk: Dict) -> float:
+        """Cosine similarity from retrieval, clamped to the rerank score range"""
+        return max(0.0, min(1.0, float(chunk.get("base_score", 0.5))))
     
     def _create_rerank_prompt(self, query: str, passages: List[Dict]) -> Dict:
         """Create reranking prompt"""
@@ -208,33 +297,18 @@ Output format: score1|score2|...|scoreN"""
         return boosted_chunks
     
     def _simple_fallback_rerank(self, query: str, chunks: List[Dict], top_k: int) -> List[Dict]:
-        """Fallback to simple keyword-based reranking"""
-        scored_chunks = []
-        query_terms = query.lower().split()
+        """Fallback ranking: BM25 over the candidates blended with their cosine score"""
+        matched, lexical_scores = bm25_search([BM25Document(chunks)], query, len(chunks))
+        top = float(lexical_scores.max()) if len(lexical_scores) else 0.0
+        lexical = {id(chunk): score / top for chunk, score in zip(matched, lexical_scores.tolist())}
         
+        scored_chunks = []
         for chunk in chunks:
-            text = chunk["text"].lower()
-            
-            # Calculate relevance score
-            score = 0
-            for term in query_terms:
-                score += text.count(term)
-            
-            # Boost score for important document terms
-            important_terms = ["table", "figure", "data", "results", "analysis", "study", "method"]
-            for term in important_terms:
-                if term in text:
-                    score += 2
-            
-            # Normalize score
-            max_possible_score = len(query_terms) * 10 + len(important_terms) * 2
-            normalized_score = min(1.0, score / max_possible_score) if max_possible_score > 0 else 0.5
-            
             scored_chunks.append({
                 "passage": chunk,
-                "score": normalized_score
+                "score": 0.5 * lexical.get(id(chunk), 0.0) + 0.5 * self._base_score(chunk)
             })
         
         # Sort by score and return top_k
         scored_chunks.sort(key=lambda x: x["score"], reverse=True)
-        return scored_chunks[:top_k] 
\ No newline at end of file
+        return scored_chunks[:top_k]
@@ -1,12 +1,15 @@
 import os
 import logging
 import asyncio
+from contextvars import ContextVar
+from typing import AsyncIterator, Optional
 from concurrent.futures import ThreadPoolExecutor
 from langchain_openai import ChatOpenAI
 from langchain_groq import ChatGroq
 from langchain_core.messages import SystemMessage, HumanMessage
 from langchain_google_genai import ChatGoogleGenerativeAI
 from config import Settings
+from services.intent_classifier import IntentClassifier
 from dotenv import load_dotenv, find_dotenv
  
  
@@ -25,6 +28,14 @@ print(f"🔑 Google Key: {'✅' if os.getenv('GOOGLE_API_KEY') else '❌'}")
 print(f"🔑 Groq Key: {'✅' if os.getenv('GROQ_API_KEY') else '❌'}")
  
  
+# Small model asked only when the local intent classifier is unsure;
+# empty means use the chat model
+INTENT_ESCALATION_MODEL = os.getenv("INTENT_ESCALATION_MODEL", "gpt-4o-mini")
+ 
+ 
+# Set by stream_response; answer-generating LLM calls push token events here
+_token_sink: ContextVar[Optional[asyncio.Queue]] = ContextVar("token_sink", default=None)
+ 
  
 class Responsellm:
     def __init__(self):
@@ -33,6 +44,11 @@ class Responsellm:
         self.embedding_service = EmbeddingService()
         # Thread pool for synchronous Groq calls
         self.executor = ThreadPoolExecutor(max_workers=3)
+        # Intent is decided on the already-loaded query encoder; the query
+        # embedding it computes is cached and reused by document retrieval
+        self.intent_classifier = IntentClassifier(
+            embed=self.embedding_service._embed_query,
+            encode_batch=self.embedding_service._encode_query_batch)
  
  
     async def generate_response(self, transcript: str, system_prompt: str = None, model: str = None, temperature: float = None, top_p: float = None, document_mode: bool = False) -> dict:
@@ -45,7 +61,7 @@ class Responsellm:
             print(f"Generating response for: {transcript}")
             print(f"Document mode: {document_mode}")
            
-            # Step 1: Classify user intent using LLM - FIXED: Now async
+            # Step 1: Classify user intent locally (LLM only when unsure)
             intent = await self._classify_user_intent(transcript, model=model)
             print(f"🎯 User intent classified as: {intent}")
            
@@ -83,6 +99,38 @@ class Responsellm:
             return {"response": None, "error": str(e)}
  
  
+    async def stream_response(self, transcript: str, system_prompt: str = None, model: str = None, temperature: float = None, top_p: float = None, document_mode: bool = False) -> AsyncIterator[dict]:
+        """
+        Streaming variant of generate_response.
+
+        Yields {"type": "token", "content": ...} events as the answer is
+        generated, then one {"type": "done", "result": ...} event carrying the
+        same dict generate_response returns (full text, sources, mode). Canned
+        replies (no documents, out of scope) arrive only in the done event.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        sink_token = _token_sink.set(queue)
+        try:
+            # The task copies the current context, so its LLM calls see the sink
+            task = asyncio.create_task(self.generate_response(
+                transcript, system_prompt, model, temperature, top_p, document_mode))
+        finally:
+            _token_sink.reset(sink_token)
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                yield event
+            yield {"type": "done", "result": task.result()}
+        finally:
+            # Client went away mid-stream: stop generating
+            if not task.done():
+                task.cancel()
+ 
+ 
     async def _handle_greeting(self, transcript: str, model: str = None) -> dict:
         """Handle greeting responses consistently for both document and LLM modes"""
         print("👋 Greeting detected - providing friendly response")
@@ -123,75 +171,12 @@ class Responsellm:
         return "general"
  
  
-    def _is_greeting(self, query: str) -> bool:
-        """Detect if the query is a greeting or casual conversation"""
-        query_lower = query.lower().strip()
- 
- 
-        # Common greetings - only standalone or at start
-        greetings = [
-            "hi", "hello", "hey", "good morning", "good afternoon", "good evening", "good night",
-            "good day", "morning", "afternoon", "evening", "night", "sup", "what's up",
-            "how are you", "how's it going", "how do you do", "pleasure to meet you",
-            "nice to meet you", "greetings", "salutations", "hi there",
-            "hello there", "hey there", "good to see you", "nice to see you"
-        ]
- 
- 
-        # Check for exact matches
-        if query_lower in greetings:
-            print(f"✅ Exact greeting match: '{query_lower}'")
-            return True
- 
- 
-        # Check for greetings with punctuation or slight variations
-        for greeting in greetings:
-            # Only match if the greeting is at the start or is a complete word
-            if (query_lower.startswith(greeting) or
-                f" {greeting} " in f" {query_lower} " or
-                    query_lower.endswith(f" {greeting}")):
-                print(
-                    f"✅ Greeting pattern match: '{greeting}' in '{query_lower}'")
-                return True
- 
- 
-        # Check for greeting patterns with regex - only at the start
-        import re
-        greeting_patterns = [
-            r"^hi\s*\w*",  # hi, hi there, hi friend
-            r"^hello\s*\w*",  # hello, hello there
-            r"^hey\s*\w*",  # hey, hey there
-            r"^good\s+(morning|afternoon|evening|night|day)",
-            r"^(morning|afternoon|evening|night|day)$",
-            r"^how\s+are\s+you",
-            r"^how\s+is\s+it\s+going",
-            r"^what\s+is\s+up",
-            r"^what's\s+up",
-            r"^sup\s*\w*",
-        ]
- 
- 
-        # Additional check: if query contains common non-greeting words, it's likely not a greeting
-        non_greeting_words = ["document", "file", "upload", "question", "answer", "what", "how", "when",
-                              "where", "why", "can", "will", "should", "from", "about", "content", "data", "information"]
-        if any(word in query_lower for word in non_greeting_words):
-            print(f"🚫 Contains non-greeting words, likely not a greeting")
-            return False
- 
- 
-        for pattern in greeting_patterns:
-            if re.match(pattern, query_lower):
-                print(
-                    f"✅ Regex greeting match: '{pattern}' for '{query_lower}'")
-                return True
- 
- 
-        print(f"❌ No greeting detected for: '{query_lower}'")
-        return False
- 
- 
-    async def _invoke_llm(self, llm, messages):
+    async def _invoke_llm(self, llm, messages, emit_tokens: bool = True):
         """Universal LLM invoker that handles both sync (Groq) and async (OpenAI/Gemini)"""
+        sink = _token_sink.get() if emit_tokens else None
+        if sink is not None:
+            return await self._stream_llm(llm, messages, sink)
+
         # Check if Groq needs sync invoke
         if isinstance(llm, tuple) and llm[0] == "groq":
             # Run synchronous Groq in thread pool to avoid blocking event loop
@@ -209,6 +194,19 @@ class Responsellm:
             return response.content
  
  
+    async def _stream_llm(self, llm, messages, sink: asyncio.Queue) -> str:
+        """Stream the completion with astream, pushing each token to the sink"""
+        # Groq streams natively over its async client, no thread pool needed
+        client = llm[1] if isinstance(llm, tuple) else llm
+        print("🌊 Streaming with astream")
+        parts = []
+        async for chunk in client.astream(messages):
+            if chunk.content:
+                parts.append(chunk.content)
+                sink.put_nowait({"type": "token", "content": chunk.content})
+        return "".join(parts)
+ 
+ 
     async def _generate_greeting_response(self, query: str, model: str = None) -> str:
         """Generate a friendly greeting response using LLM for natural conversation"""
         try:
@@ -448,10 +446,15 @@ To upload documents:
  
  
     async def _classify_user_intent(self, user_input: str, model: str = None) -> str:
-        """Use LLM to intelligently classify user intent - FIXED: Now fully async"""
-        try:
-            # Create a prompt for intent classification
-            classification_prompt = f"""Analyze this user input and classify it into one of these categories:
+        """Classify intent with the local classifier, escalating to a small LLM when unsure"""
+        return await self.intent_classifier.classify(
+            user_input, lambda text: self._classify_intent_with_llm(text, model=model))
+ 
+ 
+    async def _classify_intent_with_llm(self, user_input: str, model: str = None) -> str:
+        """Ask the LLM for the intent label; errors propagate to the classifier's fallback"""
+        # Create a prompt for intent classification
+        classification_prompt = f"""Analyze this user input and classify it into one of these categories:
  
 1. "QUESTION" - User is asking for information, clarification, or seeking knowledge
 2. "CONVERSATIONAL" - User is giving acknowledgment, confirmation, simple response, or casual conversation
@@ -477,35 +480,25 @@ User input: "{user_input}"
 Respond with only the category name (QUESTION, CONVERSATIONAL, or GREETING)."""
  
  
-            # Get LLM response for classification - FIXED: Using universal invoker
-            llm = self.get_llm_provider(model=model)
-            messages = [
-                SystemMessage(content=classification_prompt),
-                HumanMessage(content=user_input)
-            ]
- 
- 
-            response = await self._invoke_llm(llm, messages)
-            intent = response.strip().upper()
+        # Get LLM response for classification from the small escalation model
+        llm = self.get_llm_provider(model=INTENT_ESCALATION_MODEL or model, temperature=0)
+        messages = [
+            SystemMessage(content=classification_prompt),
+            HumanMessage(content=user_input)
+        ]
  
  
-            # Validate response
-            if intent in ["QUESTION", "CONVERSATIONAL", "GREETING"]:
-                return intent
-            else:
-                print(
-                    f"⚠️ Invalid LLM classification response: '{intent}', defaulting to QUESTION")
-                return "QUESTION"
+        response = await self._invoke_llm(llm, messages, emit_tokens=False)
+        intent = response.strip().upper()
  
  
-        except Exception as e:
-            logger.error(f"Error in LLM intent classification: {e}")
-            print(f"⚠️ LLM classification failed, using fallback logic")
-            # Fallback to existing greeting detection
-            if self._is_greeting(user_input):
-                return "GREETING"
-            else:
-                return "QUESTION"
+        # Validate response
+        if intent in ["QUESTION", "CONVERSATIONAL", "GREETING"]:
+            return intent
+        else:
+            print(
+                f"⚠️ Invalid LLM classification response: '{intent}', defaulting to QUESTION")
+            return "QUESTION"
  
  
     async def _handle_conversational_response(self, transcript: str, document_mode: bool, model: str = None) -> dict:
@@ -579,14 +572,14 @@ Respond naturally as if you're having a friendly conversation:"""
             current_session_id = self.embedding_service.session_manager.get_current_session_id()
             print(f"🔍 Current session: {current_session_id}")
  
-            # Step 2: Check query relevance to uploaded documents
-            relevance_check = await self.embedding_service.check_query_relevance(transcript, current_session_id)
+            # Step 2 & 3: Relevance gate and enhanced retrieval from a single scoring pass
+            search_result = await self.embedding_service.search_session(transcript, top_k=10, session_id=current_session_id)
+            relevance_check = search_result["relevance"]
  
             if not relevance_check["is_relevant"]:
                 return self._generate_out_of_scope_response(relevance_check)
  
-            # Step 3: Check for relevant documents with enhanced retrieval
-            relevant_docs = await self.embedding_service.find_relevant_chunks(transcript, top_k=10, session_id=current_session_id)
+            relevant_docs = search_result["relevant_docs"]
  
             # Step 4: Inject document context if available
             if relevant_docs:
@@ -0,0 +1,430 @@
+import os
+import json
+import sqlite3
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Callable, Dict, List, Tuple, Any
+
+from services.vector_search import EmbeddingMatrix, ShardedEmbeddings, normalize_vector
+from services.vector_shards import vector_shards
+from services.embedding_cache import embedding_cache
+from services.ann_index import ann_index_kind, create_ann_index
+from utils.embedding_codec import decode_embedding
+
+# Number of top candidates a server-side backend returns for relevance and reranking
+DEFAULT_SEARCH_CANDIDATES = int(os.getenv("VECTOR_SEARCH_CANDIDATES", "50"))
+VECTOR_UPDATE_BATCH_SIZE = 200
+# Per-session ANN indexes kept in memory before the least recently used is dropped
+ANN_MAX_SESSIONS = int(os.getenv("ANN_MAX_SESSIONS", "64"))
+
+
+class LocalMatrixBackend:
+    """Score the session's chunks in-process from cached, memory-mapped document shards.
+
+    Documents without a local shard are pulled from document_chunks once
+    and written as a shard for later loads.
+    """
+
+    name = "local"
+
+    def __init__(self, get_connection: Callable):
+        self.get_connection = get_connection
+
+    def fetch_chunks(self, doc_ids: List[str]) -> Tuple[List[np.ndarray], List[Dict[str, Any]]]:
+        """Fetch and decode all processed chunks for the given documents"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            placeholders = ','.join(['%s'] * len(doc_ids))
+            cursor.execute(f"""
+                SELECT
+                    dc.chunk_text,
+                    d.filename,
+                    dc.embedding_vector,
+                    dc.metadata
+                FROM document_chunks dc
+                JOIN documents d ON dc.doc_id = d.doc_id
+                WHERE d.doc_id IN ({placeholders})
+                AND d.status = 'processed'
+            """, doc_ids)
+            rows = cursor.fetchall()
+
+        vectors = []
+        chunks = []
+        for chunk_text, filename, embedding_text, metadata_json in rows:
+            try:
+                vectors.append(decode_embedding(embedding_text))
+                chunks.append({
+                    "text": chunk_text,
+                    "metadata": json.loads(metadata_json) if metadata_json else {},
+                    "filename": filename,
+                })
+            except Exception as e:
+                print(f"Error decoding chunk embedding: {e}")
+                continue
+
+        return vectors, chunks
+
+    def load_document(self, doc_id: str) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+        """Return a document's normalized matrix and chunks, preferring its local shard"""
+        shard = vector_shards.load(doc_id)
+        if shard is not None:
+            return shard
+
+        vectors, chunks = self.fetch_chunks([doc_id])
+        if not chunks:
+            return np.zeros((0, 0), dtype=np.float32), []
+
+        # Persist for the next cold start
+        matrix = EmbeddingMatrix(vectors, chunks).matrix
+        try:
+            vector_shards.write(doc_id, matrix, chunks)
+        except Exception as e:
+            print(f"⚠️ Could not write vector shard for {doc_id}: {e}")
+        return matrix, chunks
+
+    def load_session_embeddings(self, session_id: str, doc_ids: List[str]) -> ShardedEmbeddings:
+        """Assemble the session's per-document matrices without copying them"""
+        cached = embedding_cache.get(session_id, doc_ids)
+        if cached is not None:
+            return cached
+
+        # Read first: a document invalidated while this loads must not be cached stale
+        generation = embedding_cache.generation()
+        blocks = []
+        chunks = []
+        for doc_id in doc_ids:
+            matrix, doc_chunks = self.load_document(doc_id)
+            if doc_chunks:
+                blocks.append(matrix)
+                chunks.extend(doc_chunks)
+
+        session_embeddings = ShardedEmbeddings(blocks, chunks)
+        embedding_cache.put(session_id, doc_ids, session_embeddings, generation=generation)
+        return session_embeddings
+
+    def search(self, session_id: str, doc_ids: List[str], query_embedding: np.ndarray,
+               limit: int = None) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+        """Score every chunk of the session; all rows are returned for reranking"""
+        session_embeddings = self.load_session_embeddings(session_id, doc_ids)
+        return session_embeddings.chunks, session_embeddings.similarities(query_embedding)
+
+    def index_document(self, doc_id: str, rows: List[Dict[str, Any]]):
+        """Chunks are read straight from document_chunks; nothing extra to index"""
+        return None
+
+    def remove_documents(self, doc_ids: List[str]):
+        """Shards and cached session matrices are dropped by the session manager"""
+        return None
+
+
+class SessionANNIndex:
+    """One session's ANN index with the chunk behind each row id"""
+
+    def __init__(self, doc_ids: List[str], index, chunks: List[Dict[str, Any]]):
+        self.doc_ids = list(doc_ids)
+        self.index = index
+        self.chunks = chunks
+        # hnswlib does not allow queries while rows are being added
+        self.lock = threading.Lock()
+
+
+class ANNBackend(LocalMatrixBackend):
+    """One approximate nearest-neighbour index per session (see services/ann_index.py).
+
+    A session's first query builds a single index over all of its
+    documents' matrices (local shards, else document_chunks), so every
+    later query is one index lookup rather than a scan per document.
+    Documents added to the session are appended to its index; it is
+    rebuilt when the session grows past ANN_MIN_CHUNKS (switching to HNSW)
+    or loses a document. Sessions below ANN_MIN_CHUNKS get an exact index,
+    which is one matrix product. Indexes holding a document that is
+    re-indexed or removed are dropped and rebuilt on next use.
+    """
+
+    name = "ann"
+
+    def __init__(self, get_connection: Callable, dimension: int,
+                 candidates: int = DEFAULT_SEARCH_CANDIDATES, max_sessions: int = ANN_MAX_SESSIONS):
+        super().__init__(get_connection)
+        self.dimension = dimension
+        self.candidates = candidates
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, SessionANNIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load_blocks(self, doc_ids: List[str]) -> Tuple[List[np.ndarray], List[Dict[str, Any]]]:
+        blocks, chunks = [], []
+        for doc_id in doc_ids:
+            matrix, doc_chunks = self.load_document(doc_id)
+            if doc_chunks:
+                blocks.append(matrix)
+                chunks.extend(doc_chunks)
+        return blocks, chunks
+
+    def _build(self, doc_ids: List[str]) -> SessionANNIndex:
+        blocks, chunks = self._load_blocks(doc_ids)
+        index = create_ann_index(self.dimension, expected_size=len(chunks))
+        if chunks:
+            index.add(np.vstack(blocks))
+        return SessionANNIndex(doc_ids, index, chunks)
+
+    def _session_index(self, session_id: str, doc_ids: List[str]) -> SessionANNIndex:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                self._sessions.move_to_end(session_id)
+
+        if entry is not None and set(entry.doc_ids) == set(doc_ids):
+            return entry
+
+        if entry is not None and set(entry.doc_ids) <= set(doc_ids):
+            # Held while loading so concurrent queries do not append the same document twice
+            with entry.lock:
+                added = [doc_id for doc_id in doc_ids if doc_id not in entry.doc_ids]
+                blocks, chunks = self._load_blocks(added)
+                if ann_index_kind(len(entry.chunks) + len(chunks)) == entry.index.kind:
+                    if chunks:
+                        entry.index.add(np.vstack(blocks))
+                        entry.chunks = entry.chunks + chunks
+                    entry.doc_ids.extend(added)
+                    return entry
+
+        entry = self._build(doc_ids)
+        with self._lock:
+            self._sessions[session_id] = entry
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return entry
+
+    def search(self, session_id: str, doc_ids: List[str], query_embedding: np.ndarray,
+               limit: int = None) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+        limit = limit or self.candidates
+        entry = self._session_index(session_id, doc_ids)
+        with entry.lock:
+            ids, scores = entry.index.query(query_embedding, limit)
+            chunks = entry.chunks
+        return [chunks[i] for i in ids.tolist()], np.asarray(scores, dtype=np.float32)
+
+    def _drop_sessions_with(self, doc_ids: List[str]):
+        doc_ids = set(doc_ids)
+        with self._lock:
+            for session_id in [sid for sid, entry in self._sessions.items()
+                               if doc_ids.intersection(entry.doc_ids)]:
+                del self._sessions[session_id]
+
+    def index_document(self, doc_id: str, rows: List[Dict[str, Any]]):
+        """Sessions that indexed an earlier (or empty) version of the document rebuild on next use"""
+        self._drop_sessions_with([doc_id])
+
+    def remove_documents(self, doc_ids: List[str]):
+        self._drop_sessions_with(doc_ids)
+
+
+class SnowflakeVectorBackend:
+    """Score with VECTOR_COSINE_SIMILARITY in Snowflake and return only the top rows"""
+
+    name = "snowflake_vector"
+
+    def __init__(self, get_connection: Callable, dimension: int, candidates: int = DEFAULT_SEARCH_CANDIDATES):
+        self.get_connection = get_connection
+        self.dimension = dimension
+        self.candidates = candidates
+
+    def search(self, session_id: str, doc_ids: List[str], query_embedding: np.ndarray,
+               limit: int = None) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+        limit = limit or self.candidates
+        query_json = json.dumps(normalize_vector(query_embedding).tolist())
+
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            placeholders = ','.join(['%s'] * len(doc_ids))
+            cursor.execute(f"""
+                SELECT
+                    dc.chunk_text,
+                    d.filename,
+                    dc.metadata,
+                    VECTOR_COSINE_SIMILARITY(
+                        dc.embedding,
+                        PARSE_JSON(%s)::ARRAY::VECTOR(FLOAT, {self.dimension})
+                    ) AS similarity
+                FROM document_chunks dc
+                JOIN documents d ON dc.doc_id = d.doc_id
+                WHERE d.doc_id IN ({placeholders})
+                AND d.status = 'processed'
+                AND dc.embedding IS NOT NULL
+                ORDER BY similarity DESC
+                LIMIT %s
+            """, [query_json] + list(doc_ids) + [limit])
+            rows = cursor.fetchall()
+
+        return _rows_to_candidates(rows)
+
+    def index_document(self, doc_id: str, rows: List[Dict[str, Any]]):
+        """Fill the native VECTOR column for freshly inserted chunks with set-based updates"""
+        if not rows:
+            return
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            # Batched to keep each bound JSON payload well under the bind size limit
+            for start in range(0, len(rows), VECTOR_UPDATE_BATCH_SIZE):
+                payload = json.dumps([
+                    {"id": row["chunk_id"], "v": np.asarray(row["embedding"], dtype=np.float32).tolist()}
+                    for row in rows[start:start + VECTOR_UPDATE_BATCH_SIZE]
+                ])
+                cursor.execute(f"""
+                    UPDATE document_chunks dc
+                    SET embedding = v.vec::VECTOR(FLOAT, {self.dimension})
+                    FROM (
+                        SELECT f.value:id::STRING AS chunk_id, f.value:v::ARRAY AS vec
+                        FROM TABLE(FLATTEN(input => PARSE_JSON(%s))) f
+                    ) v
+                    WHERE dc.chunk_id = v.chunk_id
+                """, (payload,))
+            conn.commit()
+
+    def remove_documents(self, doc_ids: List[str]):
+        """The VECTOR column is deleted along with its document_chunks rows"""
+        return None
+
+
+class SQLiteVectorBackend(LocalMatrixBackend):
+    """Local stand-in for SnowflakeVectorBackend with the same top-k SQL shape.
+
+    Chunks are mirrored into a SQLite table and scored by a registered
+    VECTOR_COSINE_SIMILARITY function, so the server-side path can be
+    exercised without a warehouse. Documents missing from the mirror
+    (ingested earlier or in another process) are copied in from their
+    shard or document_chunks on first search.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, get_connection: Callable, path: str = ":memory:",
+                 candidates: int = DEFAULT_SEARCH_CANDIDATES):
+        super().__init__(get_connection)
+        self.candidates = candidates
+        self._lock = threading.Lock()
+        self._mirrored = set()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.create_function(
+            "VECTOR_COSINE_SIMILARITY", 2, _sqlite_cosine_similarity, deterministic=True)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS chunk_vectors (
+                chunk_id TEXT PRIMARY KEY,
+                doc_id TEXT,
+                chunk_text TEXT,
+                filename TEXT,
+                metadata TEXT,
+                embedding BLOB
+            )
+        """)
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_chunk_vectors_doc ON chunk_vectors (doc_id)")
+        self.conn.commit()
+
+    def _ensure_mirrored(self, doc_ids: List[str]):
+        """Copy documents that have no rows in the mirror yet"""
+        with self._lock:
+            missing = [doc_id for doc_id in doc_ids if doc_id not in self._mirrored]
+            if not missing:
+                return
+            placeholders = ','.join(['?'] * len(missing))
+            present = {row[0] for row in self.conn.execute(
+                f"SELECT DISTINCT doc_id FROM chunk_vectors WHERE doc_id IN ({placeholders})",
+                missing)}
+            self._mirrored.update(present)
+            missing = [doc_id for doc_id in missing if doc_id not in present]
+
+        for doc_id in missing:
+            matrix, chunks = self.load_document(doc_id)
+            self._write_rows(doc_id, [
+                (f"{doc_id}:{position}", doc_id, chunk["text"], chunk["filename"],
+                 json.dumps(chunk["metadata"]), np.ascontiguousarray(matrix[position], dtype=np.float32).tobytes())
+                for position, chunk in enumerate(chunks)
+            ])
+            if chunks:
+                print(f"📥 Mirrored {len(chunks)} chunks of {doc_id} into SQLite")
+
+    def _write_rows(self, doc_id: str, rows: List[Tuple]):
+        """Replace all of a document's mirrored rows"""
+        with self._lock:
+            self.conn.execute("DELETE FROM chunk_vectors WHERE doc_id = ?", (doc_id,))
+            self.conn.executemany("""
+                INSERT OR REPLACE INTO chunk_vectors
+                (chunk_id, doc_id, chunk_text, filename, metadata, embedding)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, rows)
+            self.conn.commit()
+            self._mirrored.add(doc_id)
+
+    def search(self, session_id: str, doc_ids: List[str], query_embedding: np.ndarray,
+               limit: int = None) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+        limit = limit or self.candidates
+        self._ensure_mirrored(doc_ids)
+        query_blob = normalize_vector(query_embedding).tobytes()
+        placeholders = ','.join(['?'] * len(doc_ids))
+        with self._lock:
+            rows = self.conn.execute(f"""
+                SELECT chunk_text, filename, metadata,
+                       VECTOR_COSINE_SIMILARITY(embedding, ?) AS similarity
+                FROM chunk_vectors
+                WHERE doc_id IN ({placeholders})
+                ORDER BY similarity DESC
+                LIMIT ?
+            """, [query_blob] + list(doc_ids) + [limit]).fetchall()
+        return _rows_to_candidates(rows)
+
+    def index_document(self, doc_id: str, rows: List[Dict[str, Any]]):
+        self._write_rows(doc_id, [
+            (row["chunk_id"], doc_id, row["text"], row["filename"],
+             json.dumps(row["metadata"]), normalize_vector(row["embedding"]).tobytes())
+            for row in rows
+        ])
+
+    def remove_documents(self, doc_ids: List[str]):
+        placeholders = ','.join(['?'] * len(doc_ids))
+        with self._lock:
+            self.conn.execute(
+                f"DELETE FROM chunk_vectors WHERE doc_id IN ({placeholders})", list(doc_ids))
+            self.conn.commit()
+            self._mirrored.difference_update(doc_ids)
+
+
+def _sqlite_cosine_similarity(stored: bytes, query: bytes) -> float:
+    if stored is None or query is None:
+        return None
+    return float(np.dot(normalize_vector(np.frombuffer(stored, dtype=np.float32)),
+                        np.frombuffer(query, dtype=np.float32)))
+
+
+def _rows_to_candidates(rows) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+    chunks = []
+    scores = []
+    for chunk_text, filename, metadata_json, similarity in rows:
+        chunks.append({
+            "text": chunk_text,
+            "metadata": json.loads(metadata_json) if metadata_json else {},
+            "filename": filename,
+        })
+        scores.append(similarity if similarity is not None else 0.0)
+    return chunks, np.asarray(scores, dtype=np.float32)
+
+
+def create_retrieval_backend(get_connection: Callable, dimension: int, name: str = None):
+    """Build the backend selected by RETRIEVAL_BACKEND (local, ann, snowflake_vector, sqlite).
+
+    get_connection() must return a context manager yielding a Snowflake
+    connection, e.g. snowflake_pool.connection.
+    """
+    name = (name or os.getenv("RETRIEVAL_BACKEND", "local")).lower()
+    if name == ANNBackend.name:
+        return ANNBackend(get_connection, dimension)
+    if name == SnowflakeVectorBackend.name:
+        return SnowflakeVectorBackend(get_connection, dimension)
+    if name == SQLiteVectorBackend.name:
+        return SQLiteVectorBackend(get_connection, os.getenv("SQLITE_VECTOR_DB", ":memory:"))
+    if name != LocalMatrixBackend.name:
+        print(f"⚠️ Unknown RETRIEVAL_BACKEND '{name}', using local")
+    return LocalMatrixBackend(get_connection)
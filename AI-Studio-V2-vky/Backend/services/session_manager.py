@@ -1,10 +1,12 @@
-import os
 import uuid
 import time
 import json
-import snowflake.connector
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta
+from services.embedding_cache import embedding_cache
+from services.vector_shards import vector_shards
+from services.bm25_index import bm25_indexes
+from utils.snowflake_pool import snowflake_pool
 
 
 class DocumentSessionManager:
@@ -26,21 +28,6 @@ class DocumentSessionManager:
         self.session_documents: Dict[str, List[str]] = {}
         self.session_start_times: Dict[str, float] = {}
 
-        # Initialize Snowflake connection
-        self.snowflake_config = self._get_snowflake_config()
-
-    def _get_snowflake_config(self):
-        """Get Snowflake configuration from environment variables"""
-        return {
-            'user': os.getenv('SNOWFLAKE_USER'),
-            'password': os.getenv('SNOWFLAKE_PASSWORD'),
-            'account': os.getenv('SNOWFLAKE_ACCOUNT'),
-            'warehouse': os.getenv('SNOWFLAKE_WAREHOUSE'),
-            'database': os.getenv('SNOWFLAKE_DATABASE'),
-            'schema': os.getenv('SNOWFLAKE_SCHEMA'),
-            'role': os.getenv('SNOWFLAKE_ROLE')  # Optional
-        }
-
     def create_session(self) -> str:
         """Create a new session and return session ID"""
         session_id = str(uuid.uuid4())
@@ -105,6 +92,11 @@ class DocumentSessionManager:
                 session_id, snowflake_conn)
 
             # Clean up session data
+            embedding_cache.invalidate_session(session_id)
+            for doc_id in doc_ids:
+                vector_shards.delete(doc_id)
+                bm25_indexes.delete(doc_id)
+            self._remove_from_retrieval_backend(doc_ids)
             del self.sessions[session_id]
             del self.session_documents[session_id]
             if session_id in self.session_start_times:
@@ -128,6 +120,8 @@ class DocumentSessionManager:
     def cleanup_all_sessions(self, snowflake_conn=None) -> Dict:
         """Clean up all sessions (for testing/debugging)"""
         session_ids = list(self.sessions.keys())
+        doc_ids = [doc_id for session_id in session_ids
+                   for doc_id in self.session_documents.get(session_id, [])]
         total_deleted = 0
 
         for session_id in session_ids:
@@ -135,18 +129,33 @@ class DocumentSessionManager:
             if result.get("success"):
                 total_deleted += 1
 
+        # Also covers sessions whose cleanup failed after their rows were deleted
+        self._remove_from_retrieval_backend(doc_ids)
+
         return {
             "success": True,
             "total_sessions_cleaned": total_deleted,
             "message": f"Cleaned up {total_deleted} sessions"
         }
 
+    def _remove_from_retrieval_backend(self, doc_ids: List[str]):
+        """Drop documents from the live retrieval backend's indexes (ANN, SQLite mirror)"""
+        # Imported here: embedding_service imports this module
+        from services.embedding_service import EmbeddingService
+
+        if not doc_ids or not EmbeddingService._initialized:
+            return
+        try:
+            EmbeddingService().retrieval_backend.remove_documents(doc_ids)
+        except Exception as e:
+            print(f"⚠️ Could not remove documents from the retrieval backend: {e}")
+
     def _delete_session_chunks(self, session_id: str, snowflake_conn=None) -> int:
         """Delete all chunks for documents in a session"""
         try:
-            # Use provided connection or create new one
+            # Use provided connection or check one out of the shared pool
             if snowflake_conn is None:
-                conn = snowflake.connector.connect(**self.snowflake_config)
+                conn = snowflake_pool.acquire()
                 should_close = True
             else:
                 conn = snowflake_conn
@@ -184,9 +193,9 @@ class DocumentSessionManager:
     def _delete_session_documents(self, session_id: str, snowflake_conn=None) -> int:
         """Delete all documents for a session"""
         try:
-            # Use provided connection or create new one
+            # Use provided connection or check one out of the shared pool
             if snowflake_conn is None:
-                conn = snowflake.connector.connect(**self.snowflake_config)
+                conn = snowflake_pool.acquire()
                 should_close = True
             else:
                 conn = snowflake_conn
@@ -0,0 +1,125 @@
+import numpy as np
+from typing import List, Dict, Any, Tuple
+
+
+def normalize_vector(vector) -> np.ndarray:
+    """Return a float32 unit-length copy of a single embedding"""
+    vec = np.asarray(vector, dtype=np.float32).ravel()
+    norm = np.linalg.norm(vec)
+    if norm == 0:
+        return vec
+    return vec / norm
+
+
+class EmbeddingMatrix:
+    """Session embeddings packed into one contiguous float32 matrix.
+
+    Rows are normalized once at build time, so cosine similarity against a
+    unit-length query is a single matrix-vector product.
+    """
+
+    def __init__(self, vectors, chunks: List[Dict[str, Any]]):
+        self.chunks = chunks
+        if len(chunks) == 0:
+            self.matrix = np.zeros((0, 0), dtype=np.float32)
+            return
+
+        matrix = np.array(vectors, dtype=np.float32).reshape(len(chunks), -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+        self.matrix = np.ascontiguousarray(matrix)
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    @property
+    def dimension(self) -> int:
+        return self.matrix.shape[1] if self.matrix.ndim == 2 else 0
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.matrix.nbytes)
+
+    def similarities(self, query_vector) -> np.ndarray:
+        """Cosine similarity of the query against every row"""
+        if len(self.chunks) == 0:
+            return np.zeros(0, dtype=np.float32)
+        return self.matrix @ normalize_vector(query_vector)
+
+    def top_k(self, query_vector, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Indices of the k best rows (highest first) plus the full score vector"""
+        scores = self.similarities(query_vector)
+        return top_k_indices(scores, k), scores
+
+
+class ShardedEmbeddings:
+    """Session embeddings kept as several pre-normalized float32 blocks.
+
+    Blocks are typically memory-mapped per-document shards; each is scored
+    in place and the scores are concatenated, so rows are never copied
+    into a combined matrix. Exposes the same interface as EmbeddingMatrix.
+    """
+
+    def __init__(self, blocks: List[np.ndarray], chunks: List[Dict[str, Any]]):
+        self.blocks = [block for block in blocks if len(block)]
+        self.chunks = chunks
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    @property
+    def dimension(self) -> int:
+        return self.blocks[0].shape[1] if self.blocks else 0
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(block.nbytes for block in self.blocks))
+
+    def similarities(self, query_vector) -> np.ndarray:
+        """Cosine similarity of the query against every row, in chunk order"""
+        if not self.blocks:
+            return np.zeros(0, dtype=np.float32)
+        query = normalize_vector(query_vector)
+        return np.concatenate([block @ query for block in self.blocks])
+
+    def top_k(self, query_vector, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Indices of the k best rows (highest first) plus the full score vector"""
+        scores = self.similarities(query_vector)
+        return top_k_indices(scores, k), scores
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest scores, sorted descending, via argpartition"""
+    n = len(scores)
+    if n == 0 or k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if k >= n:
+        return np.argsort(-scores)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+def shortlist_indices(scores: np.ndarray, size: int, min_keep: int = 1, cut: str = "none",
+                      gap: float = 0.08) -> np.ndarray:
+    """Top-`size` indices by score (highest first), optionally cut where relevance drops off.
+
+    cut="gap" stops before the first drop between neighbouring scores larger
+    than `gap`; cut="elbow" stops at the point of the sorted curve farthest
+    below the straight line from the best to the worst shortlisted score.
+    At least `min_keep` indices survive either cut.
+    """
+    order = top_k_indices(scores, size)
+    if cut == "none" or len(order) <= min_keep:
+        return order
+
+    ranked = scores[order]
+    if cut == "gap":
+        drops = np.nonzero(ranked[:-1] - ranked[1:] > gap)[0]
+        keep = int(drops[0]) + 1 if len(drops) else len(order)
+    elif cut == "elbow":
+        line = np.linspace(ranked[0], ranked[-1], len(ranked))
+        keep = int(np.argmax(line - ranked)) + 1
+    else:
+        raise ValueError(f"Unknown shortlist cut '{cut}'")
+    return order[:max(keep, min_keep)]
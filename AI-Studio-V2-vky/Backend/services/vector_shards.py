@@ -0,0 +1,95 @@
+import os
+import re
+import json
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
+
+SHARD_VERSION = 1
+
+
+class VectorShardStore:
+    """Per-document embedding shards on local disk.
+
+    Each doc_id gets `<doc_id>.npy` (float32, unit-length rows) and a
+    `<doc_id>.json` sidecar holding the row count, dimension, chunk_ids and
+    chunk texts/metadata in row order. Shards are opened with mmap_mode='r',
+    so repeated loads are served from the OS page cache without copying.
+    """
+
+    def __init__(self, root_dir: str, enabled: bool = True):
+        self.root_dir = root_dir
+        self.enabled = enabled
+        if self.enabled:
+            os.makedirs(self.root_dir, exist_ok=True)
+
+    def _paths(self, doc_id: str) -> Tuple[str, str]:
+        safe_id = re.sub(r"[^A-Za-z0-9_.-]", "_", doc_id)
+        base = os.path.join(self.root_dir, safe_id)
+        return base + ".npy", base + ".json"
+
+    def write(self, doc_id: str, embeddings, chunks: List[Dict[str, Any]], chunk_ids: List[str] = None):
+        """Persist a document's normalized embeddings and chunk sidecar atomically"""
+        if not self.enabled or not chunks:
+            return
+
+        matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(chunks), -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix = np.ascontiguousarray(matrix / norms)
+
+        npy_path, meta_path = self._paths(doc_id)
+        sidecar = {
+            "version": SHARD_VERSION,
+            "doc_id": doc_id,
+            "count": int(matrix.shape[0]),
+            "dimension": int(matrix.shape[1]),
+            "chunk_ids": chunk_ids or [],
+            "chunks": chunks,
+        }
+
+        # Write to temp files and rename so readers never see a partial shard
+        tmp_npy = npy_path + ".tmp"
+        with open(tmp_npy, "wb") as f:
+            np.save(f, matrix)
+        tmp_meta = meta_path + ".tmp"
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump(sidecar, f)
+        os.replace(tmp_npy, npy_path)
+        os.replace(tmp_meta, meta_path)
+
+    def load(self, doc_id: str) -> Optional[Tuple[np.ndarray, List[Dict[str, Any]]]]:
+        """Return (memory-mapped matrix, chunks) or None when no valid shard exists"""
+        if not self.enabled:
+            return None
+
+        npy_path, meta_path = self._paths(doc_id)
+        if not (os.path.exists(npy_path) and os.path.exists(meta_path)):
+            return None
+
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                sidecar = json.load(f)
+            matrix = np.load(npy_path, mmap_mode="r")
+            if sidecar.get("version") != SHARD_VERSION or matrix.shape[0] != sidecar.get("count"):
+                print(f"⚠️ Ignoring stale vector shard for {doc_id}")
+                return None
+            return matrix, sidecar["chunks"]
+        except Exception as e:
+            print(f"⚠️ Failed to load vector shard for {doc_id}: {e}")
+            return None
+
+    def delete(self, doc_id: str):
+        for path in self._paths(doc_id):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print(f"⚠️ Failed to delete vector shard file {path}: {e}")
+
+
+# Shared by EmbeddingService, the retrieval backends and DocumentSessionManager
+vector_shards = VectorShardStore(
+    root_dir=os.getenv("VECTOR_SHARD_DIR", "vector_shards"),
+    enabled=os.getenv("VECTOR_SHARDS_ENABLED", "true").lower() == "true",
+)
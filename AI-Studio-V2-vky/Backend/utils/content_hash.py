@@ -0,0 +1,24 @@
+import re
+import hashlib
+import unicodedata
+
+
+def normalize_chunk_text(text: str) -> str:
+    """Canonical form of a chunk for hashing: NFKC with collapsed whitespace"""
+    text = unicodedata.normalize("NFKC", text or "")
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def chunk_content_hash(text: str, model_id: str) -> str:
+    """sha256 of the embedding model id and normalized chunk text.
+
+    Two chunks with the same hash encode to the same vector, so a stored
+    embedding can be reused instead of running the encoder again.
+    """
+    payload = f"{model_id}\n{normalize_chunk_text(text)}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+def file_content_hash(file_content: bytes) -> str:
+    """sha256 of the raw uploaded bytes"""
+    return hashlib.sha256(file_content).hexdigest()
@@ -0,0 +1,52 @@
+import os
+import json
+import base64
+import numpy as np
+
+# Storage formats for document_chunks.embedding_vector:
+#   f16  - "b64f16:" + base64 of little-endian float16 (default, ~3.7x smaller than JSON)
+#   f32  - "b64f32:" + base64 of little-endian float32 (~1.9x smaller than JSON)
+#   json - legacy JSON list of floats rounded to 6 decimals
+FORMAT_PREFIXES = {
+    "f16": "b64f16:",
+    "f32": "b64f32:",
+}
+FORMAT_DTYPES = {
+    "f16": np.dtype("<f2"),
+    "f32": np.dtype("<f4"),
+}
+
+DEFAULT_FORMAT = os.getenv("EMBEDDING_STORAGE_FORMAT", "f16").lower()
+
+
+def encode_embedding(vector, fmt: str = None) -> str:
+    """Serialize an embedding for the embedding_vector TEXT column"""
+    fmt = (fmt or DEFAULT_FORMAT).lower()
+    if fmt == "json":
+        return json.dumps([round(float(x), 6) for x in np.asarray(vector).ravel()])
+    if fmt not in FORMAT_PREFIXES:
+        raise ValueError(f"Unsupported embedding storage format: {fmt}")
+
+    packed = np.asarray(vector, dtype=FORMAT_DTYPES[fmt]).ravel().tobytes()
+    return FORMAT_PREFIXES[fmt] + base64.b64encode(packed).decode("ascii")
+
+
+def decode_embedding(value) -> np.ndarray:
+    """Deserialize a stored embedding (any supported format) to float32"""
+    if isinstance(value, (bytes, bytearray)):
+        value = value.decode("ascii")
+
+    for fmt, prefix in FORMAT_PREFIXES.items():
+        if value.startswith(prefix):
+            raw = base64.b64decode(value[len(prefix):])
+            return np.frombuffer(raw, dtype=FORMAT_DTYPES[fmt]).astype(np.float32)
+
+    # Legacy rows written before the binary formats
+    return np.asarray(json.loads(value), dtype=np.float32)
+
+
+def is_legacy_embedding(value) -> bool:
+    """True for rows still stored as JSON text"""
+    if isinstance(value, (bytes, bytearray)):
+        value = value.decode("ascii")
+    return not any(value.startswith(prefix) for prefix in FORMAT_PREFIXES.values())
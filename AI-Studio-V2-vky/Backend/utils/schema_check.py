@@ -0,0 +1,45 @@
+import logging
+import threading
+
+from utils.snowflake_pool import snowflake_pool
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_content_hash_columns = None
+
+
+def has_content_hash_columns() -> bool:
+    """Whether documents and document_chunks both have a content_hash column.
+
+    Checked once per process (at startup, or on first use). Until
+    `python -m utils.snowflake_setup content_hash` has run, uploads and chunk
+    inserts use the old column list and hash-based reuse is skipped. A failed
+    check is retried on the next call.
+    """
+    global _content_hash_columns
+    if _content_hash_columns is not None:
+        return _content_hash_columns
+
+    with _lock:
+        if _content_hash_columns is None:
+            try:
+                with snowflake_pool.connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute("""
+                        SELECT COUNT(DISTINCT table_name)
+                        FROM information_schema.columns
+                        WHERE table_schema = CURRENT_SCHEMA()
+                        AND table_name IN ('DOCUMENTS', 'DOCUMENT_CHUNKS')
+                        AND column_name = 'CONTENT_HASH'
+                    """)
+                    present = cursor.fetchone()[0] == 2
+            except Exception as e:
+                logger.warning(f"content_hash column check failed: {e}")
+                return False
+
+            _content_hash_columns = present
+            if not present:
+                print("⚠️ content_hash columns missing; run `python -m utils.snowflake_setup content_hash` "
+                      "to enable duplicate upload and embedding reuse")
+        return _content_hash_columns
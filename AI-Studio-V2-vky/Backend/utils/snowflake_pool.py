@@ -0,0 +1,207 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+import snowflake.connector
+
+from utils.snowflake_setup import get_snowflake_config
+
+logger = logging.getLogger(__name__)
+
+SNOWFLAKE_POOL_SIZE = int(os.getenv("SNOWFLAKE_POOL_SIZE", "8"))
+# Idle connections older than this are closed instead of reused
+SNOWFLAKE_POOL_MAX_IDLE_SECONDS = float(os.getenv("SNOWFLAKE_POOL_MAX_IDLE_SECONDS", "600"))
+# Connections idle for longer than this get a SELECT 1 before being handed out
+SNOWFLAKE_POOL_PING_AFTER_SECONDS = float(os.getenv("SNOWFLAKE_POOL_PING_AFTER_SECONDS", "60"))
+SNOWFLAKE_POOL_CHECKOUT_TIMEOUT = float(os.getenv("SNOWFLAKE_POOL_CHECKOUT_TIMEOUT", "30"))
+# Bounds on opening a connection and on each network request, so a hung
+# endpoint cannot park pool threads indefinitely
+SNOWFLAKE_CONNECT_TIMEOUT = int(os.getenv("SNOWFLAKE_CONNECT_TIMEOUT", "10"))
+SNOWFLAKE_NETWORK_TIMEOUT = int(os.getenv("SNOWFLAKE_NETWORK_TIMEOUT", "10"))
+
+
+class PooledConnection:
+    """A checked-out Snowflake connection; close() hands it back to the pool.
+
+    Everything else is forwarded to the underlying connector connection, so
+    code written as connect() ... conn.close() works unchanged.
+    """
+
+    def __init__(self, pool: "SnowflakeConnectionPool", conn):
+        self._pool = pool
+        self._conn = conn
+        self._released = False
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            self._pool.release(self._conn)
+
+    def __getattr__(self, attr):
+        if self._released:
+            raise RuntimeError("Connection was already returned to the pool")
+        return getattr(self._conn, attr)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class SnowflakeConnectionPool:
+    """Bounded, thread-safe pool of Snowflake connections shared by all services.
+
+    At most `max_size` connections exist at once; callers beyond that wait
+    up to `checkout_timeout` seconds. Idle connections are reused newest
+    first, evicted after `max_idle_seconds`, and pinged before reuse when
+    they have been idle longer than `ping_after_seconds`.
+    """
+
+    def __init__(self, max_size: int = SNOWFLAKE_POOL_SIZE,
+                 max_idle_seconds: float = SNOWFLAKE_POOL_MAX_IDLE_SECONDS,
+                 ping_after_seconds: float = SNOWFLAKE_POOL_PING_AFTER_SECONDS,
+                 checkout_timeout: float = SNOWFLAKE_POOL_CHECKOUT_TIMEOUT):
+        self.max_size = max_size
+        self.max_idle_seconds = max_idle_seconds
+        self.ping_after_seconds = ping_after_seconds
+        self.checkout_timeout = checkout_timeout
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._idle: List[Tuple[object, float]] = []
+        self._lock = threading.Lock()
+        self._config = None
+        self.in_use = 0
+        self.created = 0
+        self.reused = 0
+        self.evicted = 0
+        self.failed_health_checks = 0
+        self.checkout_timeouts = 0
+
+    def _connect(self):
+        if self._config is None:
+            self._config = dict(get_snowflake_config(),
+                                connect_timeout=SNOWFLAKE_CONNECT_TIMEOUT,
+                                network_timeout=SNOWFLAKE_NETWORK_TIMEOUT)
+        conn = snowflake.connector.connect(**self._config)
+        with self._lock:
+            self.created += 1
+        return conn
+
+    def _is_healthy(self, conn, idle_for: float) -> bool:
+        if conn.is_closed():
+            return False
+        if idle_for < self.ping_after_seconds:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except Exception as e:
+            logger.warning(f"Discarding unhealthy Snowflake connection: {e}")
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def acquire(self) -> PooledConnection:
+        """Check out a connection; call close() (or use `with`) to return it"""
+        if not self.reserve(self.checkout_timeout):
+            self.checkout_timed_out()
+        return self.checkout()
+
+    def reserve(self, timeout: float = 0) -> bool:
+        """Take one of the `max_size` slots without opening a connection.
+
+        timeout=0 never blocks, so coroutines can wait for a slot on the
+        event loop instead of parking a thread (see services/async_db.py).
+        """
+        if timeout == 0:
+            return self._slots.acquire(blocking=False)
+        return self._slots.acquire(timeout=timeout)
+
+    def checkout_timed_out(self):
+        with self._lock:
+            self.checkout_timeouts += 1
+        raise TimeoutError(
+            f"No Snowflake connection available within {self.checkout_timeout}s")
+
+    def checkout(self) -> PooledConnection:
+        """Reuse or open a connection for a slot taken with reserve(); the slot is given back on failure"""
+        try:
+            while True:
+                with self._lock:
+                    if not self._idle:
+                        break
+                    conn, idle_since = self._idle.pop()
+                idle_for = time.monotonic() - idle_since
+                if idle_for > self.max_idle_seconds:
+                    with self._lock:
+                        self.evicted += 1
+                    self._discard(conn)
+                    continue
+                if not self._is_healthy(conn, idle_for):
+                    with self._lock:
+                        self.failed_health_checks += 1
+                    self._discard(conn)
+                    continue
+                with self._lock:
+                    self.reused += 1
+                    self.in_use += 1
+                return PooledConnection(self, conn)
+
+            conn = self._connect()
+            with self._lock:
+                self.in_use += 1
+            return PooledConnection(self, conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn):
+        with self._lock:
+            self.in_use -= 1
+            if not conn.is_closed():
+                self._idle.append((conn, time.monotonic()))
+                conn = None
+        if conn is not None:
+            self._discard(conn)
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "in_use": self.in_use,
+                "idle": len(self._idle),
+                "created": self.created,
+                "reused": self.reused,
+                "evicted_idle": self.evicted,
+                "failed_health_checks": self.failed_health_checks,
+                "checkout_timeouts": self.checkout_timeouts,
+            }
+
+
+# Shared by every service; connections are opened on first checkout
+snowflake_pool = SnowflakeConnectionPool()
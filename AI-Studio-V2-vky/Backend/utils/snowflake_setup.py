@@ -1,4 +1,5 @@
 import os
+import json
 import snowflake.connector
 from dotenv import load_dotenv
 
@@ -23,6 +24,11 @@ def get_snowflake_config():
     return config
 
 
+def get_snowflake_connection():
+    """Open a new Snowflake connection from the environment configuration"""
+    return snowflake.connector.connect(**get_snowflake_config())
+
+
 def create_tables():
     """Create Snowflake tables for document storage and API usage tracking"""
     try:
@@ -40,11 +46,16 @@ def create_tables():
                 file_size INTEGER,
                 file_type VARCHAR(50),
                 text_content TEXT,
+                content_hash VARCHAR(64),  -- sha256 of the uploaded bytes, for re-upload dedup
                 upload_timestamp TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
                 status VARCHAR(50) DEFAULT 'uploaded'
             )
         """)
 
+        # Tables created before content_hash was added
+        cursor.execute(
+            "ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)")
+
         print("Dropping existing document_chunks table if exists...")
         cursor.execute("DROP TABLE IF EXISTS document_chunks")
 
@@ -55,8 +66,10 @@ def create_tables():
                 doc_id VARCHAR(255),
                 chunk_text TEXT,
                 chunk_index INTEGER,
-                embedding_vector TEXT,  -- Store as TEXT instead of VARIANT for better compatibility
+                embedding_vector TEXT,  -- Packed base64 float16/float32, see utils/embedding_codec.py
+                embedding VECTOR(FLOAT, 384),  -- Native vector for RETRIEVAL_BACKEND=snowflake_vector
                 metadata TEXT,  -- Store enhanced metadata as JSON
+                content_hash VARCHAR(64),  -- sha256 of model id + normalized chunk text, see utils/content_hash.py
                 created_timestamp TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
                 FOREIGN KEY (doc_id) REFERENCES documents(doc_id)
             )
@@ -178,9 +191,158 @@ def create_api_usage_table():
         raise e
 
 
+def migrate_embedding_vectors(batch_size: int = 500, fmt: str = None):
+    """Re-encode legacy JSON embedding_vector rows into the packed storage format"""
+    from utils.embedding_codec import encode_embedding, decode_embedding, is_legacy_embedding
+
+    try:
+        config = get_snowflake_config()
+        conn = snowflake.connector.connect(**config)
+        read_cursor = conn.cursor()
+        write_cursor = conn.cursor()
+
+        print("Scanning document_chunks for legacy JSON embeddings...")
+        read_cursor.execute("""
+            SELECT chunk_id, embedding_vector
+            FROM document_chunks
+            WHERE embedding_vector LIKE '[%'
+        """)
+
+        migrated = 0
+        while True:
+            rows = read_cursor.fetchmany(batch_size)
+            if not rows:
+                break
+
+            updates = [
+                (encode_embedding(decode_embedding(embedding), fmt), chunk_id)
+                for chunk_id, embedding in rows
+                if embedding and is_legacy_embedding(embedding)
+            ]
+            if updates:
+                write_cursor.executemany(
+                    "UPDATE document_chunks SET embedding_vector = %s WHERE chunk_id = %s",
+                    updates)
+                conn.commit()
+                migrated += len(updates)
+                print(f"Migrated {migrated} embeddings...")
+
+        conn.close()
+        print(f"✅ Embedding migration complete: {migrated} rows re-encoded")
+        return migrated
+
+    except Exception as e:
+        print(f"❌ Error migrating embeddings: {e}")
+        raise e
+
+
+def add_vector_column(dimension: int = 384, batch_size: int = 200):
+    """Add the native VECTOR column to document_chunks and backfill it from embedding_vector"""
+    from utils.embedding_codec import decode_embedding
+
+    try:
+        config = get_snowflake_config()
+        conn = snowflake.connector.connect(**config)
+        read_cursor = conn.cursor()
+        write_cursor = conn.cursor()
+
+        print("Adding VECTOR column to document_chunks...")
+        write_cursor.execute(f"""
+            ALTER TABLE document_chunks
+            ADD COLUMN IF NOT EXISTS embedding VECTOR(FLOAT, {dimension})
+        """)
+
+        read_cursor.execute("""
+            SELECT chunk_id, embedding_vector
+            FROM document_chunks
+            WHERE embedding IS NULL AND embedding_vector IS NOT NULL
+        """)
+
+        backfilled = 0
+        while True:
+            rows = read_cursor.fetchmany(batch_size)
+            if not rows:
+                break
+
+            payload = json.dumps([
+                {"id": chunk_id, "v": decode_embedding(embedding).tolist()}
+                for chunk_id, embedding in rows
+            ])
+            write_cursor.execute(f"""
+                UPDATE document_chunks dc
+                SET embedding = v.vec::VECTOR(FLOAT, {dimension})
+                FROM (
+                    SELECT f.value:id::STRING AS chunk_id, f.value:v::ARRAY AS vec
+                    FROM TABLE(FLATTEN(input => PARSE_JSON(%s))) f
+                ) v
+                WHERE dc.chunk_id = v.chunk_id
+            """, (payload,))
+            conn.commit()
+            backfilled += len(rows)
+            print(f"Backfilled {backfilled} vectors...")
+
+        conn.close()
+        print(f"✅ VECTOR column ready: {backfilled} rows backfilled")
+        return backfilled
+
+    except Exception as e:
+        print(f"❌ Error adding VECTOR column: {e}")
+        raise e
+
+
+def add_content_hash_columns(model_id: str = "all-MiniLM-L6-v2", batch_size: int = 500):
+    """Add the content_hash columns and backfill chunk hashes so existing vectors can be reused"""
+    from utils.content_hash import chunk_content_hash
+
+    try:
+        config = get_snowflake_config()
+        conn = snowflake.connector.connect(**config)
+        read_cursor = conn.cursor()
+        write_cursor = conn.cursor()
+
+        print("Adding content_hash columns...")
+        write_cursor.execute(
+            "ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)")
+        write_cursor.execute(
+            "ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)")
+
+        read_cursor.execute("""
+            SELECT chunk_id, chunk_text
+            FROM document_chunks
+            WHERE content_hash IS NULL
+        """)
+
+        backfilled = 0
+        while True:
+            rows = read_cursor.fetchmany(batch_size)
+            if not rows:
+                break
+
+            write_cursor.executemany(
+                "UPDATE document_chunks SET content_hash = %s WHERE chunk_id = %s",
+                [(chunk_content_hash(chunk_text, model_id), chunk_id) for chunk_id, chunk_text in rows])
+            conn.commit()
+            backfilled += len(rows)
+            print(f"Hashed {backfilled} chunks...")
+
+        conn.close()
+        print(f"✅ content_hash columns ready: {backfilled} chunks backfilled")
+        return backfilled
+
+    except Exception as e:
+        print(f"❌ Error adding content_hash columns: {e}")
+        raise e
+
+
 if __name__ == "__main__":
     import sys
     if len(sys.argv) > 1 and sys.argv[1] == "api_usage":
         create_api_usage_table()
+    elif len(sys.argv) > 1 and sys.argv[1] == "migrate_embeddings":
+        migrate_embedding_vectors()
+    elif len(sys.argv) > 1 and sys.argv[1] == "vector_column":
+        add_vector_column()
+    elif len(sys.argv) > 1 and sys.argv[1] == "content_hash":
+        add_content_hash_columns()
     else:
         create_tables()
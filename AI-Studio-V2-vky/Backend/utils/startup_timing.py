@@ -0,0 +1,54 @@
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, List
+
+
+class StartupTimer:
+    """Records how long each boot phase (imports, logins, service and model loads) takes"""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.phases: List[Dict] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                self.phases.append({
+                    "phase": name,
+                    "seconds": round(seconds, 3),
+                    "offset_seconds": round(start - self.started_at, 3),
+                })
+
+    def mark(self, name: str):
+        """Record a phase that started when the timer was created (e.g. module imports)"""
+        with self._lock:
+            self.phases.append({
+                "phase": name,
+                "seconds": round(time.perf_counter() - self.started_at, 3),
+                "offset_seconds": 0.0,
+            })
+
+    def report(self) -> Dict:
+        with self._lock:
+            return {
+                "phases": list(self.phases),
+                "elapsed_seconds": round(time.perf_counter() - self.started_at, 3),
+            }
+
+    def print_report(self):
+        report = self.report()
+        print("⏱️ Startup timing:")
+        for phase in report["phases"]:
+            print(f"   {phase['phase']:<32} {phase['seconds']:>8.3f}s (at +{phase['offset_seconds']:.3f}s)")
+        print(f"   {'total since process start':<32} {report['elapsed_seconds']:>8.3f}s")
+
+
+# Created on first import, which main.py does before anything heavy
+startup_timer = StartupTimer()